@@ -0,0 +1,288 @@
+"""
+Асинхронные GET-обработчики читающих эндпоинтов. Подключаются в
+api/urls.py перед роутером, если включен ASYNC_READS (его выставляет
+foodgram/asgi.py), поэтому WSGI-развертывание их не использует.
+
+Данные читаются асинхронным ORM и сериализуются теми же
+сериализаторами, что и в синхронных вьюсетах, так что ответы
+совпадают. Обработчик возвращает None, если случай нестандартный
+(другой метод, не-JSON формат, курсорная пагинация, ошибка
+авторизации, несуществующая страница или объект), и тогда запрос
+выполняет синхронный вьюсет.
+"""
+import functools
+import math
+from collections import OrderedDict
+
+from api.serializers import (IngredientSerializer, RecipeReadSerializer,
+                             TagSerializer, UserReadSerializer)
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.urls import path
+from django.utils.cache import patch_vary_headers
+from food.catalog import ingredient_index
+from food.models import Ingredient, Tag
+from rest_framework import status
+from rest_framework.authentication import get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def json_response(data):
+    return HttpResponse(JSONRenderer().render(data),
+                        content_type=JSONRenderer.media_type)
+
+
+def wants_json(request):
+    """
+    Проверяет, что клиент ждет JSON, а не browsable API или другой формат
+    """
+    return (api_settings.URL_FORMAT_OVERRIDE not in request.GET
+            and 'text/html' not in request.headers.get('Accept', ''))
+
+
+async def authenticate(request):
+    """
+    Асинхронная аутентификация по токену djoser
+    @param request: объект HttpRequest
+    @return: пользователь, AnonymousUser или None, если заголовок
+             некорректен и ответ с ошибкой должен сформировать вьюсет
+    """
+    auth = get_authorization_header(request).split()
+    if not auth or auth[0].lower() != b'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(
+            key=auth[1].decode())
+    except (Token.DoesNotExist, UnicodeError):
+        return None
+    return token.user if token.user.is_active else None
+
+
+def allowed_methods(view):
+    """
+    Методы, которые синхронный вьюсет перечисляет в заголовке Allow
+    @param view: функция из as_view вьюсета
+    @return: список методов
+    """
+    instance = view.cls(**view.initkwargs)
+    actions = {'head': view.actions.get('get'), **view.actions}
+    for method, action in actions.items():
+        setattr(instance, method, getattr(instance, action))
+    return instance.allowed_methods
+
+
+def not_modified(view, etag, last_modified):
+    """
+    Ответ 304 без тела и без Content-Type, как у синхронного вьюсета
+    """
+    response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    del response['Content-Type']
+    return view.add_validators(response, etag, last_modified)
+
+
+def read_endpoint(viewset, actions, **initkwargs):
+    """
+    Делает из корутины обработчик URL: GET с JSON идет в корутину,
+    все остальное - в синхронный вьюсет
+    @param viewset: класс вьюсета
+    @param actions: словарь {метод: действие} для синхронного вьюсета
+    @param initkwargs: параметры as_view, как их передает роутер
+    """
+    sync_view = viewset.as_view(actions, **initkwargs)
+    allow = ', '.join(allowed_methods(sync_view))
+    sync_view = sync_to_async(sync_view)
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def view(request, **kwargs):
+            if request.method == 'GET' and wants_json(request):
+                user = await authenticate(request)
+                if user is not None:
+                    request.user = user
+                    response = await handler(request, **kwargs)
+                    if response is not None:
+                        # Те же заголовки, что ставит
+                        # APIView.finalize_response
+                        response['Allow'] = allow
+                        patch_vary_headers(response, ('Accept',))
+                        return response
+            return await sync_view(request, **kwargs)
+
+        view.csrf_exempt = True
+        return view
+
+    return decorator
+
+
+def make_view(viewset, request, action, **kwargs):
+    """
+    Создает экземпляр вьюсета для переиспользования его queryset,
+    фильтров, пагинатора и ETag
+    """
+    drf_request = Request(request, authenticators=())
+    drf_request.user = request.user
+    return viewset(request=drf_request, args=(), kwargs=kwargs,
+                   action=action, format_kwarg=None)
+
+
+def serializer_context(view):
+    return {'request': view.request, 'format': None, 'view': view}
+
+
+async def filtered_recipes(view):
+    """
+    Применяет RecipeFilter. Проверка параметров может обращаться к базе
+    (теги), поэтому выполняется в потоке.
+    @return: queryset или None при некорректных параметрах
+    """
+    try:
+        return await sync_to_async(view.filter_queryset)(view.queryset.all())
+    except ValidationError:
+        return None
+
+
+def page_links(request, paginator, number, pages):
+    url = request.build_absolute_uri()
+    param = paginator.page_query_param
+    next_link = (replace_query_param(url, param, number + 1)
+                 if number < pages else None)
+    if number == 1:
+        return next_link, None
+    if number == 2:
+        return next_link, remove_query_param(url, param)
+    return next_link, replace_query_param(url, param, number - 1)
+
+
+@read_endpoint(RecipeViewSet, {'get': 'list', 'post': 'create'},
+               basename='recipes', detail=False)
+async def recipe_list(request):
+    view = make_view(RecipeViewSet, request, 'list')
+    paginator = view.paginator
+    if paginator.is_cursor_mode(view.request):
+        return None
+    filtered = await filtered_recipes(view)
+    if filtered is None:
+        return None
+    etag, last_modified = await view.aget_etag(filtered)
+    if view.is_not_modified(etag, last_modified):
+        return not_modified(view, etag, last_modified)
+    try:
+        number = int(request.GET.get(paginator.page_query_param, 1))
+    except ValueError:
+        return None
+    size = paginator.get_page_size(view.request)
+    count = await filtered.acount()
+    pages = max(math.ceil(count / size), 1)
+    if not 1 <= number <= pages:
+        return None
+    view.queryset = filtered
+    recipes = [recipe async for recipe in
+               view.get_queryset()[(number - 1) * size:number * size]]
+    next_link, previous_link = page_links(request, paginator, number, pages)
+    data = OrderedDict((
+        ('count', count),
+        ('next', next_link),
+        ('previous', previous_link),
+        ('results', RecipeReadSerializer(
+            recipes, many=True, context=serializer_context(view)).data),
+    ))
+    return view.add_validators(json_response(data), etag, last_modified)
+
+
+@read_endpoint(RecipeViewSet, {'get': 'retrieve', 'patch': 'partial_update',
+                               'delete': 'destroy'},
+               basename='recipes', detail=True)
+async def recipe_detail(request, pk):
+    view = make_view(RecipeViewSet, request, 'retrieve', pk=pk)
+    filtered = await filtered_recipes(view)
+    if filtered is None:
+        return None
+    filtered = filtered.filter(pk=pk)
+    etag, last_modified = await view.aget_etag(filtered)
+    if view.is_not_modified(etag, last_modified):
+        return not_modified(view, etag, last_modified)
+    view.queryset = filtered
+    recipe = await view.get_queryset().afirst()
+    if recipe is None:
+        return None
+    data = RecipeReadSerializer(
+        recipe, context=serializer_context(view)).data
+    return view.add_validators(json_response(data), etag, last_modified)
+
+
+@read_endpoint(UserViewSet, {'get': 'me'}, basename='users', detail=False,
+               **UserViewSet.me.kwargs)
+async def user_me(request):
+    if not request.user.is_authenticated:
+        return None
+    return json_response(UserReadSerializer(request.user).data)
+
+
+@read_endpoint(TagViewSet, {'get': 'list'}, basename='tags', detail=False)
+async def tag_list(request):
+    view = make_view(TagViewSet, request, 'list')
+
+    async def render():
+        tags = [tag async for tag in Tag.objects.all()]
+        return TagSerializer(tags, many=True).data
+
+    return await view.acached_response(render)
+
+
+@read_endpoint(TagViewSet, {'get': 'retrieve'}, basename='tags', detail=True)
+async def tag_detail(request, pk):
+    view = make_view(TagViewSet, request, 'retrieve', pk=pk)
+
+    async def render():
+        tag = await Tag.objects.filter(pk=pk).afirst()
+        return TagSerializer(tag).data if tag else None
+
+    return await view.acached_response(render)
+
+
+@read_endpoint(IngredientViewSet, {'get': 'list'}, basename='ingredients',
+               detail=False)
+async def ingredient_list(request):
+    view = make_view(IngredientViewSet, request, 'list')
+    prefix = request.GET.get(api_settings.SEARCH_PARAM, '').strip()
+    if prefix:
+        return json_response(
+            await sync_to_async(ingredient_index.search)(prefix))
+
+    async def render():
+        # Индекс перестраивается запросом к базе при смене версии каталога
+        return await sync_to_async(ingredient_index.search)()
+
+    return await view.acached_response(render)
+
+
+@read_endpoint(IngredientViewSet, {'get': 'retrieve'},
+               basename='ingredients', detail=True)
+async def ingredient_detail(request, pk):
+    view = make_view(IngredientViewSet, request, 'retrieve', pk=pk)
+
+    async def render():
+        ingredient = await Ingredient.objects.filter(pk=pk).afirst()
+        return IngredientSerializer(ingredient).data if ingredient else None
+
+    return await view.acached_response(render)
+
+
+urlpatterns = [
+    path('recipes/', recipe_list),
+    path('recipes/<int:pk>/', recipe_detail),
+    path('users/me/', user_me),
+    path('tags/', tag_list),
+    path('tags/<int:pk>/', tag_detail),
+    path('ingredients/', ingredient_list),
+    path('ingredients/<int:pk>/', ingredient_detail),
+]
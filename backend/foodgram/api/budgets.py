@@ -0,0 +1,48 @@
+"""
+Бюджеты эндпоинтов из api/urls.py: максимальное число SQL-запросов на
+один запрос и 95-й перцентиль времени ответа в миллисекундах.
+Проверяются командой check_budgets. Число запросов проверяется всегда,
+время - только с --check-latency: оно зависит от машины. Бюджеты времени
+взяты из замеров на большом наборе SQLite с запасом примерно в три раза.
+
+Подстановки в пути: {recipe} - рецепт, которого нет в избранном и корзине
+пользователя, {author} - автор, на которого пользователь не подписан.
+Запросы выполняются по порядку, поэтому POST и DELETE одного эндпоинта
+идут парой и не меняют состояние базы между повторами. non_empty -
+ответ обязан содержать хотя бы один объект, иначе бюджет измеряет
+пустую выдачу.
+"""
+from collections import namedtuple
+
+Budget = namedtuple('Budget',
+                    ('name', 'method', 'path', 'queries', 'p95', 'non_empty'),
+                    defaults=(False,))
+
+BUDGETS = (
+    Budget('recipes-list', 'get', '/api/recipes/?limit=20', 7, 450),
+    Budget('recipes-search', 'get', '/api/recipes/?limit=20&search=рецепт',
+           7, 250, non_empty=True),
+    Budget('recipes-popular', 'get',
+           '/api/recipes/?limit=20&ordering=popular&window=week', 7, 400),
+    Budget('recipes-detail', 'get', '/api/recipes/{recipe}/', 6, 60),
+    Budget('recipes-favorite-add', 'post',
+           '/api/recipes/{recipe}/favorite/', 12, 30),
+    Budget('recipes-favorite-remove', 'delete',
+           '/api/recipes/{recipe}/favorite/', 12, 30),
+    Budget('recipes-shopping-cart-add', 'post',
+           '/api/recipes/{recipe}/shopping_cart/', 12, 30),
+    Budget('recipes-shopping-cart-remove', 'delete',
+           '/api/recipes/{recipe}/shopping_cart/', 12, 30),
+    Budget('recipes-download-shopping-cart', 'get',
+           '/api/recipes/download_shopping_cart/', 2, 20),
+    Budget('users-list', 'get', '/api/users/?limit=20', 3, 30),
+    Budget('users-me', 'get', '/api/users/me/', 1, 15),
+    Budget('users-subscriptions', 'get',
+           '/api/users/subscriptions/?limit=20&recipes_limit=3', 4, 350),
+    Budget('users-subscribe', 'post', '/api/users/{author}/subscribe/', 10,
+           40),
+    Budget('users-unsubscribe', 'delete',
+           '/api/users/{author}/subscribe/', 9, 30),
+    Budget('tags-list', 'get', '/api/tags/', 2, 15),
+    Budget('ingredients-list', 'get', '/api/ingredients/?name=аб', 2, 20),
+)
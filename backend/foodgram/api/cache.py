@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from food.versions import get_version
+from foodgram.db_router import use_primary
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+
+
+class LRUBytesCache:
+    """
+    Кэш готовых ответов в памяти процесса. Вытесняет давно не
+    использованные записи, когда суммарный размер превышает max_bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            content = self._items.get(key)
+            if content is not None:
+                self._items.move_to_end(key)
+            return content
+
+    def set(self, key, content):
+        if len(content) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = content
+            self.size += len(content)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+local_cache = LRUBytesCache(settings.REFERENCE_CACHE_MAX_BYTES)
+
+
+class RenderedCacheMixin:
+    """
+    Кэширует отрендеренный JSON списка и объекта справочника: сначала
+    в памяти процесса, затем в общем бэкенде Django. Ключ содержит метку
+    версии cache_version_name, которая меняется при изменении данных,
+    поэтому кэш заполняется чтением из основной базы, а не с реплики.
+    """
+    cache_version_name = None
+
+    def get_cache_key(self):
+        version = get_version(self.cache_version_name)
+        return (f'api:rendered:{self.cache_version_name}:{version}:'
+                f'{self.request.get_full_path()}')
+
+    def cached_response(self, render):
+        """
+        Возвращает готовый JSON из кэша или формирует и кэширует его
+        @param render: функция, формирующая объект Response
+        @return: объект HttpResponse или Response
+        """
+        renderer = self.request.accepted_renderer
+        if renderer.format != 'json':
+            return render()
+        key = self.get_cache_key()
+        content = local_cache.get(key)
+        if content is None:
+            content = cache.get(key)
+            if content is None:
+                with use_primary():
+                    response = render()
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                content = renderer.render(
+                    response.data, self.request.accepted_media_type,
+                    self.get_renderer_context())
+                cache.set(key, content, settings.REFERENCE_CACHE_TIMEOUT)
+            local_cache.set(key, content)
+        return HttpResponse(content, content_type=renderer.media_type)
+
+    async def acached_response(self, render):
+        """
+        Асинхронный вариант cached_response, только для JSON
+        @param render: корутинная функция, возвращающая данные ответа
+                       или None, если ответ должен сформировать
+                       синхронный вьюсет
+        @return: объект HttpResponse или None
+        """
+        key = await sync_to_async(self.get_cache_key)()
+        content = local_cache.get(key)
+        if content is None:
+            content = await cache.aget(key)
+            if content is None:
+                with use_primary():
+                    data = await render()
+                if data is None:
+                    return None
+                content = JSONRenderer().render(data)
+                await cache.aset(key, content,
+                                 settings.REFERENCE_CACHE_TIMEOUT)
+            local_cache.set(key, content)
+        return HttpResponse(content, content_type=JSONRenderer.media_type)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            lambda: super(RenderedCacheMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            lambda: super(RenderedCacheMixin, self).retrieve(
+                request, *args, **kwargs))
@@ -1,28 +1,80 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from food.models import Recipe, Tag
+from food.models import Favorite, Recipe, ShoppingCart, Tag, TagRecipe
+from food.popularity import WINDOWS
+from food.search import search_recipes
+
+POPULAR = 'popular'
+DEFAULT_WINDOW = 'all'
+
+
+def popularity_field(query_params):
+    """
+    Поле популярности, по которому нужно сортировать рецепты
+    @param query_params: параметры запроса
+    @return: имя поля или None, если сортировка по популярности не нужна
+    """
+    if query_params.get('ordering') != POPULAR:
+        return None
+    window = query_params.get('window') or DEFAULT_WINDOW
+    return WINDOWS.get(window, WINDOWS[DEFAULT_WINDOW])[0]
 
 
 class RecipeFilter(FilterSet):
+    """
+    Фильтры рецептов. Теги, избранное и корзина проверяются через
+    EXISTS, поэтому рецепты в выдаче не дублируются. search - полнотекстовый
+    поиск по названию и описанию с сортировкой по релевантности.
+    ordering=popular сортирует по популярности за окно window (day, week,
+    all) по индексу на рецепте.
+    """
     tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
                                              to_field_name='slug',
-                                             queryset=Tag.objects.all())
+                                             queryset=Tag.objects.all(),
+                                             method='tags_filter')
+    is_favorited = filters.BooleanFilter(
+        method='is_favorited_filter')
     is_favorite = filters.BooleanFilter(
         method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter')
+    search = filters.CharFilter(method='search_filter')
+    window = filters.ChoiceFilter(
+        choices=[(name, name) for name in WINDOWS], method='window_filter')
+    ordering = filters.ChoiceFilter(
+        choices=[(POPULAR, POPULAR)], method='ordering_filter')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
-    def is_favorite_filter(self, queryset, name, value):
+    def tags_filter(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value)))
+
+    def user_relation_filter(self, queryset, model, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite_recipe__user=user)
+            return queryset.filter(Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
+    def is_favorited_filter(self, queryset, name, value):
+        return self.user_relation_filter(queryset, Favorite, value)
+
     def is_in_shopping_cart_filter(self, queryset, name, value):
-        user = self.request.user
-        if value and user.is_authenticated:
-            return queryset.filter(shopping_recipe__user=user)
+        return self.user_relation_filter(queryset, ShoppingCart, value)
+
+    def search_filter(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def window_filter(self, queryset, name, value):
         return queryset
+
+    def ordering_filter(self, queryset, name, value):
+        field = popularity_field(self.data)
+        return queryset.order_by(f'-{field}', '-id')
@@ -0,0 +1,243 @@
+"""
+Сценарии нагрузочного теста для команды load_test. Вес сценария задает
+долю запросов в смеси трафика, auth - нужен ли токен пользователя.
+Сценарии с двумя шагами (добавить и убрать) выполняются парой, чтобы
+состояние базы не дрейфовало за время прогона. После неуспешного шага
+остальные шаги сценария пропускаются: убирать можно только то, что этот
+же сценарий добавил, иначе прогон удалял бы засеянные связи.
+
+READ_SCENARIOS - только чтение через эндпоинты api.async_views, для
+сравнения WSGI и ASGI командой benchmark_async.
+
+Подстановки в пути: {recipe}, {tag}, {author}, {prefix}, {page}.
+"""
+import json
+import random
+import threading
+import time
+from collections import defaultdict, namedtuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import quote, urljoin
+from urllib.request import Request, urlopen
+
+Step = namedtuple('Step', ('name', 'method', 'path'))
+Scenario = namedtuple('Scenario', ('weight', 'auth', 'steps'))
+
+SCENARIOS = (
+    Scenario(30, False, (
+        Step('recipes-list', 'GET', '/api/recipes/?page={page}&limit=6'),
+    )),
+    Scenario(15, False, (
+        Step('recipes-detail', 'GET', '/api/recipes/{recipe}/'),
+    )),
+    Scenario(15, False, (
+        Step('recipes-by-tag', 'GET',
+             '/api/recipes/?tags={tag}&page={page}&limit=6'),
+    )),
+    Scenario(15, False, (
+        Step('ingredients-autocomplete', 'GET',
+             '/api/ingredients/?name={prefix}'),
+    )),
+    Scenario(6, True, (
+        Step('favorite-add', 'POST', '/api/recipes/{recipe}/favorite/'),
+        Step('favorite-remove', 'DELETE', '/api/recipes/{recipe}/favorite/'),
+    )),
+    Scenario(5, True, (
+        Step('cart-add', 'POST', '/api/recipes/{recipe}/shopping_cart/'),
+        Step('cart-remove', 'DELETE',
+             '/api/recipes/{recipe}/shopping_cart/'),
+    )),
+    Scenario(5, True, (
+        Step('subscriptions', 'GET',
+             '/api/users/subscriptions/?limit=6&recipes_limit=3'),
+    )),
+    Scenario(5, True, (
+        Step('subscribe', 'POST', '/api/users/{author}/subscribe/'),
+        Step('unsubscribe', 'DELETE', '/api/users/{author}/subscribe/'),
+    )),
+    Scenario(4, True, (
+        Step('download-shopping-cart', 'GET',
+             '/api/recipes/download_shopping_cart/'),
+    )),
+)
+
+READ_SCENARIOS = tuple(
+    scenario for scenario in SCENARIOS if not scenario.auth
+) + (
+    Scenario(10, False, (
+        Step('tags-list', 'GET', '/api/tags/'),
+    )),
+    Scenario(15, True, (
+        Step('users-me', 'GET', '/api/users/me/'),
+    )),
+)
+
+
+def percentile(ordered, share):
+    """
+    Перцентиль по методу ближайшего ранга
+    @param ordered: отсортированный список значений
+    @param share: доля от 0 до 1
+    @return: значение перцентиля
+    """
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))]
+
+
+class LoadTest:
+    """
+    Прогон смеси сценариев в несколько потоков против запущенного сервера
+    """
+
+    def __init__(self, base_url, timeout=10, mix=SCENARIOS):
+        self.base_url = base_url
+        self.mix = mix
+        self.timeout = timeout
+        self.tokens = []
+        self.values = {}
+        self.results = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.lock = threading.Lock()
+
+    def request(self, method, path, token=None, data=None):
+        """
+        Выполняет HTTP-запрос и читает тело ответа целиком
+        @return: статус и тело ответа, статус 0 - ошибка соединения
+        """
+        headers = {'Accept': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        request = Request(urljoin(self.base_url, path), data=body,
+                          headers=headers, method=method)
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.read()
+        except HTTPError as error:
+            return error.code, error.read()
+        except (URLError, OSError):
+            return 0, b''
+
+    def get_json(self, path):
+        status, body = self.request('GET', path)
+        if status != 200:
+            raise RuntimeError(f'GET {path}: статус {status}')
+        return json.loads(body)
+
+    def login(self, emails, password):
+        """
+        Получает токены djoser для пользователей
+        @param emails: адреса пользователей
+        @param password: общий пароль
+        """
+        for email in emails:
+            status, body = self.request(
+                'POST', '/api/auth/token/login/',
+                data={'email': email, 'password': password})
+            if status == 200:
+                self.tokens.append(json.loads(body)['auth_token'])
+        if not self.tokens:
+            raise RuntimeError('Не удалось получить ни одного токена.')
+
+    def discover(self, sample=100):
+        """
+        Собирает id рецептов, тегов, авторов и префиксы ингредиентов
+        для подстановки в пути
+        """
+        recipes = self.get_json(f'/api/recipes/?limit={sample}')
+        users = self.get_json(f'/api/users/?limit={sample}')
+        names = [item['name'] for item in self.get_json('/api/ingredients/')]
+        random.Random(0).shuffle(names)
+        self.values = {
+            'recipe': [item['id'] for item in recipes['results']],
+            'tag': [item['slug'] for item in self.get_json('/api/tags/')],
+            'author': [item['id'] for item in users['results']],
+            'prefix': sorted({name[:2] for name in names[:sample]}),
+            'page': list(range(1, max(recipes['count'] // 6, 1) + 1))[:20],
+        }
+        if not self.values['recipe'] or not self.values['author']:
+            raise RuntimeError('В базе нет рецептов или пользователей.')
+
+    def run_scenario(self, rng, scenario):
+        values = {name: quote(str(rng.choice(choices)))
+                  for name, choices in self.values.items() if choices}
+        token = rng.choice(self.tokens) if scenario.auth else None
+        for step in scenario.steps:
+            path = step.path.format(**values)
+            started = time.perf_counter()
+            status, _ = self.request(step.method, path, token)
+            elapsed = (time.perf_counter() - started) * 1000
+            with self.lock:
+                self.results[step.name].append(elapsed)
+                self.statuses[step.name][status] += 1
+            if not 200 <= status < 300:
+                break
+
+    def worker(self, seed, deadline, remaining):
+        rng = random.Random(seed)
+        weights = [scenario.weight for scenario in self.mix]
+        while time.monotonic() < deadline:
+            with self.lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            self.run_scenario(
+                rng, rng.choices(self.mix, weights=weights)[0])
+
+    def run(self, concurrency, duration, scenarios, seed=0):
+        """
+        Запускает потоки и ждет окончания прогона
+        @param concurrency: число потоков
+        @param duration: ограничение по времени в секундах
+        @param scenarios: ограничение по числу сценариев
+        @return: время прогона в секундах
+        """
+        deadline = time.monotonic() + duration
+        remaining = [scenarios]
+        threads = [threading.Thread(target=self.worker,
+                                    args=(seed + number, deadline, remaining))
+                   for number in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
+
+    def summary(self, elapsed):
+        """
+        @return: пропускная способность и перцентили по эндпоинтам
+        """
+        endpoints = {}
+        for name, times in sorted(self.results.items()):
+            ordered = sorted(times)
+            statuses = self.statuses[name]
+            endpoints[name] = {
+                'requests': len(ordered),
+                'errors': sum(count for status, count in statuses.items()
+                              if status == 0 or status >= 500),
+                'statuses': {str(status): count
+                             for status, count in sorted(statuses.items())},
+                'rps': round(len(ordered) / elapsed, 2),
+                'mean_ms': round(sum(ordered) / len(ordered), 2),
+                'p50_ms': round(percentile(ordered, 0.5), 2),
+                'p95_ms': round(percentile(ordered, 0.95), 2),
+                'p99_ms': round(percentile(ordered, 0.99), 2),
+                'max_ms': round(ordered[-1], 2),
+            }
+        everything = sorted(value for times in self.results.values()
+                            for value in times)
+        total = {
+            'requests': len(everything),
+            'errors': sum(item['errors'] for item in endpoints.values()),
+            'rps': round(len(everything) / elapsed, 2),
+            'p50_ms': round(percentile(everything, 0.5) or 0, 2),
+            'p95_ms': round(percentile(everything, 0.95) or 0, 2),
+            'p99_ms': round(percentile(everything, 0.99) or 0, 2),
+        }
+        return {'elapsed_s': round(elapsed, 2), 'total': total,
+                'endpoints': endpoints}
@@ -1,5 +1,117 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (CursorPagination, PageNumberPagination,
+                                       _reverse_ordering)
 
+POSITION_SEPARATOR = '|'
 
-class CustomPaginator(PageNumberPagination):
+
+class CustomCursorPaginator(CursorPagination):
+    """
+    Постраничный вывод по курсору без COUNT(*) и OFFSET. Позиция курсора
+    составная - значения всех полей ordering, поэтому следующая страница
+    находится по индексу, даже если у многих объектов одинаковое значение
+    первого поля (CursorPagination в этом случае листает через OFFSET
+    и упирается в offset_cutoff).
+    """
+    page_size_query_param = 'limit'
+    ordering = ('id',)
+
+    def _get_position_from_instance(self, instance, ordering):
+        return POSITION_SEPARATOR.join(
+            str(getattr(instance, field.lstrip('-'))) for field in ordering)
+
+    def position_filter(self, position, reverse):
+        """
+        Условие «строго после позиции» по всем полям ordering
+        @param position: составная позиция из курсора
+        @param reverse: курсор листает назад
+        @return: объект Q
+        """
+        values = position.split(POSITION_SEPARATOR)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        condition, equal = Q(pk__in=[]), Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, position = self.cursor or (0, False, None)
+        queryset = queryset.order_by(
+            *(_reverse_ordering(self.ordering) if reverse else self.ordering))
+        if position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.position_filter(position, reverse))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(results[-1],
+                                                         self.ordering)
+        has_current = position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = has_current, bool(following)
+            self.next_position, self.previous_position = position, following
+        else:
+            self.has_next, self.has_previous = bool(following), has_current
+            self.next_position, self.previous_position = following, position
+        self.display_page_controls = (
+            (self.has_previous or self.has_next) and self.template is not None)
+        return self.page
+
+
+class FeedCursorPaginator(CustomCursorPaginator):
+    """Лента подписок: курсор по времени публикации рецепта в ленте."""
+    ordering = ('-feed_date', '-id')
+
+
+class LimitPageNumberPaginator(PageNumberPagination):
+    """Постраничный вывод по номеру страницы с размером в параметре limit."""
     page_size_query_param = 'limit'
+
+
+class CustomPaginator(LimitPageNumberPaginator):
+    """
+    Постраничный вывод по номеру страницы. С параметром pagination=cursor
+    (или при переданном cursor) переключается на курсор, упорядоченный
+    по cursor_ordering вьюсета.
+    """
+    pagination_mode_query_param = 'pagination'
+    cursor_paginator = None
+
+    def is_cursor_mode(self, request):
+        return (
+            request.query_params.get(self.pagination_mode_query_param)
+            == 'cursor'
+            or CustomCursorPaginator.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_cursor_mode(request):
+            self.cursor_paginator = None
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = CustomCursorPaginator()
+        self.cursor_paginator.ordering = getattr(
+            view, 'cursor_ordering', CustomCursorPaginator.ordering)
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,13 +1,35 @@
 import djoser.serializers as djoser_serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core import exceptions as django_exceptions
+from django.core.files.storage import default_storage
+from django.core.validators import FileExtensionValidator
 from django.db import transaction
-from drf_base64.fields import Base64ImageField
+from drf_base64.fields import Base64FileField, Base64ImageField
 from food.models import (Favorite, Ingredient, IngredientAmount, Recipe,
                          ShoppingCart, Tag)
+from food.pantry import PANTRY_MAX_MISSING, PANTRY_MAX_SIZE, pantry_index
+from PIL import Image
 from rest_framework import serializers
 from users.models import Subscribe, User
 
+RECIPE_IMAGE_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'webp')
+
+
+def validate_image_header(file):
+    """
+    Проверяет, что загруженный файл - картинка. verify() читает заголовок
+    и структуру файла, не декодируя пиксели, поэтому проверка дешевая,
+    а обработчик картинок не получает заведомо битые файлы.
+    @param file: загруженный файл
+    """
+    try:
+        Image.open(file).verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise django_exceptions.ValidationError(
+            'Загрузите корректное изображение.')
+    finally:
+        file.seek(0)
+
 
 class UserReadSerializer(djoser_serializers.UserSerializer):
     """[GET] Список пользователей."""
@@ -26,6 +48,8 @@ class UserReadSerializer(djoser_serializers.UserSerializer):
         @return: Флаг, указывающий, подписан ли текущий пользователь
         на указанного пользователя.
         """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if (self.context.get('request')
            and not self.context['request'].user.is_anonymous):
             return Subscribe.objects.filter(user=self.context['request'].user,
@@ -102,7 +126,49 @@ class SetPasswordSerializer(serializers.Serializer):
         return validated_data
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeImageVariantsMixin(serializers.Serializer):
+    """Ссылки на варианты картинки рецепта разного размера и формата."""
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
+    def image_url(self, name):
+        url = default_storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image_variants(self, obj):
+        """
+        Возвращает готовые варианты картинки рецепта
+        @param obj: экземпляр модели Recipe
+        @return: словарь {вариант: {'width': ширина, формат: ссылка}}
+        """
+        return {
+            variant: {key: (self.image_url(value) if key != 'width'
+                            else value)
+                      for key, value in files.items()}
+            for variant, files in obj.image_variants.items()
+            if isinstance(files, dict)
+        }
+
+    def get_image_srcset(self, obj):
+        """
+        Возвращает значения атрибута srcset для каждого формата. Варианты
+        одной ширины (у небольших картинок) входят в srcset один раз.
+        @param obj: экземпляр модели Recipe
+        @return: словарь {формат: 'ссылка 160w, ссылка 600w, ...'}
+        """
+        srcset = {}
+        for files in self.get_image_variants(obj).values():
+            for key, url in files.items():
+                if key != 'width':
+                    srcset.setdefault(key, {}).setdefault(
+                        files['width'], f'{url} {files["width"]}w')
+        return {key: ', '.join(items.values())
+                for key, items in srcset.items()}
+
+
+class RecipeSerializer(RecipeImageVariantsMixin,
+                       serializers.ModelSerializer):
     """Список рецептов."""
     image = Base64ImageField(read_only=True)
     name = serializers.ReadOnlyField()
@@ -111,14 +177,20 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'name',
-                  'image', 'cooking_time')
+                  'image', 'image_variants', 'image_srcset',
+                  'cooking_time')
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    """Параметр recipes_limit для списка подписок."""
+    recipes_limit = serializers.IntegerField(min_value=0, required=False)
 
 
 class SubscriptionsSerializer(serializers.ModelSerializer):
     """[GET] Список авторов на которых подписан пользователь."""
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -133,33 +205,29 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
         @param obj: экземпляр модели User
         @return: True, если пользователь подписан, иначе False
         """
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return (
             self.context.get('request').user.is_authenticated
             and Subscribe.objects.filter(user=self.context['request'].user,
                                          author=obj).exists()
         )
 
-    @staticmethod
-    def get_recipes_count(obj):
-        """
-        Получает количество рецептов у автора
-        @param obj: экземпляр модели User
-        @return: количество рецептов у автора
-        """
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
         """
         Получает список рецептов автора
         @param obj: экземпляр модели User
         @return: список рецептов автора
         """
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
-        serializer = RecipeSerializer(recipes, many=True, read_only=True)
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            limit = self.context.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit is not None:
+                recipes = recipes[:limit]
+        serializer = RecipeSerializer(recipes, many=True, read_only=True,
+                                      context=self.context)
         return serializer.data
 
 
@@ -169,7 +237,7 @@ class SubscribeAuthorSerializer(serializers.ModelSerializer):
     username = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
     recipes = RecipeSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -200,15 +268,6 @@ class SubscribeAuthorSerializer(serializers.ModelSerializer):
                                          author=obj).exists()
         )
 
-    @staticmethod
-    def get_recipes_count(obj):
-        """
-        Получает количество рецептов у автора
-        @param obj: экземпляр модели User
-        @return: количество рецептов у автора
-        """
-        return obj.recipes.count()
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     """[GET] Список ингредиентов."""
@@ -237,7 +296,8 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
                   'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(RecipeImageVariantsMixin,
+                           serializers.ModelSerializer):
     """[GET] Список рецептов."""
     author = UserReadSerializer(read_only=True)
     tags = TagSerializer(many=True, read_only=True)
@@ -252,8 +312,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'tags',
                   'author', 'ingredients',
                   'is_favorite', 'is_in_shopping_cart',
-                  'name', 'image',
-                  'text', 'cooking_time')
+                  'name', 'image', 'image_status', 'image_variants',
+                  'image_srcset', 'text', 'cooking_time')
 
     def get_is_favorite(self, obj):
         """
@@ -261,7 +321,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         @param obj: экземпляр модели Recipe
         @return: True, если рецепт добавлен в избранное, иначе False
         """
-
+        if hasattr(obj, 'is_favorite'):
+            return obj.is_favorite
         return (
             self.context.get('request').user.is_authenticated
             and Favorite.objects.filter(user=self.context['request'].user,
@@ -274,6 +335,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         @param obj: экземпляр модели Recipe
         @return: True, если рецепт добавлен в список покупок, иначе False
         """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return (
             self.context.get('request').user.is_authenticated
             and ShoppingCart.objects.filter(user=self.context['request'].user,
@@ -281,6 +344,26 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
 
+class PantryRecipeSerializer(RecipeReadSerializer):
+    """[GET] Рецепт, подобранный по имеющимся ингредиентам."""
+    matched_count = serializers.ReadOnlyField()
+    missing_count = serializers.ReadOnlyField()
+    missing_ingredients = serializers.ReadOnlyField()
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + (
+            'matched_count', 'missing_count', 'missing_ingredients')
+
+
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=PANTRY_MAX_SIZE)
+    missing = serializers.IntegerField(
+        min_value=0, max_value=PANTRY_MAX_MISSING, default=0)
+
+
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """Ингредиент и количество для создания рецепта."""
     id = serializers.IntegerField()
@@ -297,7 +380,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     author = UserReadSerializer(read_only=True)
     id = serializers.ReadOnlyField()
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField()
+    image = Base64FileField(validators=[
+        FileExtensionValidator(RECIPE_IMAGE_EXTENSIONS),
+        validate_image_header])
 
     class Meta:
         model = Recipe
@@ -358,6 +443,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
+        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
+        transaction.on_commit(lambda: pantry_index.update_recipe(
+            recipe.pk, ingredient_ids))
 
     @transaction.atomic
     def create(self, validated_data):
@@ -368,8 +456,8 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         """
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(author=self.context['request'].user,
-                                       **validated_data)
+        author = self.context['request'].user
+        recipe = Recipe.objects.create(author=author, **validated_data)
         self.tags_and_ingredients_set(recipe, tags, ingredients)
         return recipe
 
@@ -381,7 +469,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         @param validated_data: словарь с данными для обновления рецепта
         @return: обновленный рецепта
         """
-        instance.image = validated_data.get('image', instance.image)
+        if 'image' in validated_data:
+            instance.image = validated_data['image']
+            instance.image_status = Recipe.IMAGE_PENDING
+            instance.image_variants = {}
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get(
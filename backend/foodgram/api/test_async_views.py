@@ -0,0 +1,127 @@
+"""
+Асинхронные обработчики отдают те же байты, что и синхронные вьюсеты.
+Каждый запрос выполняется дважды: синхронным вьюсетом по обычным URL
+и через AsyncClient по URL этого модуля, где обработчики ASYNC_READS
+стоят перед роутером, как в foodgram/asgi.py.
+"""
+from contextlib import contextmanager
+from unittest import mock
+
+from api import async_views
+from api.cache import local_cache
+from api.tests import ApiTestCase, create_recipes
+from api.urls import urlpatterns as api_urlpatterns
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+urlpatterns = [
+    path('api/', include(async_views.urlpatterns + api_urlpatterns)),
+]
+
+COMPARED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Vary', 'Allow')
+
+
+class AsyncReadsTests(ApiTestCase):
+    """Ответы асинхронных обработчиков совпадают с синхронными."""
+
+    def setUp(self):
+        create_recipes(self.author, 12, self.tags, self.ingredients)
+
+    def headers_for(self, user):
+        if user is None:
+            return {}
+        token, _ = Token.objects.get_or_create(user=user)
+        return {'Authorization': f'Token {token.key}'}
+
+    def clear_caches(self):
+        local_cache.clear()
+        cache.clear()
+
+    @contextmanager
+    def sync_forbidden(self, viewset, action):
+        """
+        Запрещает синхронному вьюсету обработать запрос
+        """
+        if viewset is None:
+            yield
+            return
+        with mock.patch.object(viewset, action, create=True,
+                               side_effect=AssertionError(
+                                   f'{viewset.__name__}.{action}')):
+            yield
+
+    async def async_get(self, url, headers):
+        return await self.async_client.get(url, headers=headers)
+
+    def assert_same(self, url, user=None, headers=None, served_by=None):
+        """
+        Сравнивает синхронный и асинхронный ответы
+        @param served_by: (вьюсет, действие), которое асинхронный
+                          обработчик должен выполнить сам, без вьюсета
+        @return: синхронный ответ
+        """
+        headers = {**self.headers_for(user), **(headers or {})}
+        self.clear_caches()
+        expected = self.client.get(url, headers=headers)
+        self.clear_caches()
+        with override_settings(ROOT_URLCONF=__name__):
+            with self.sync_forbidden(*(served_by or (None, None))):
+                response = async_to_sync(self.async_get)(url, headers)
+        self.assertEqual(response.status_code, expected.status_code, url)
+        self.assertEqual(response.content, expected.content, url)
+        for header in COMPARED_HEADERS:
+            self.assertEqual(response.get(header), expected.get(header),
+                             f'{url}: {header}')
+        return expected
+
+    def test_recipes(self):
+        recipe = self.author.recipes.first()
+        tag = self.tags[0].slug
+        for url in ('/api/recipes/', '/api/recipes/?page=2&limit=5',
+                    f'/api/recipes/?tags={tag}&author={self.author.pk}'):
+            for user in (None, self.reader):
+                with self.subTest(url=url, user=user):
+                    self.assert_same(url, user,
+                                     served_by=(RecipeViewSet, 'list'))
+        with self.subTest('detail'):
+            self.assert_same(f'/api/recipes/{recipe.pk}/', self.reader,
+                             served_by=(RecipeViewSet, 'retrieve'))
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/recipes/')['ETag']
+        response = self.assert_same(
+            '/api/recipes/', headers={'If-None-Match': etag},
+            served_by=(RecipeViewSet, 'list'))
+        self.assertEqual(response.status_code, 304)
+
+    def test_references_and_me(self):
+        tag, ingredient = self.tags[0], self.ingredients[0]
+        for url, served_by, user in (
+                ('/api/tags/', (TagViewSet, 'list'), None),
+                (f'/api/tags/{tag.pk}/', (TagViewSet, 'retrieve'), None),
+                ('/api/ingredients/', (IngredientViewSet, 'list'), None),
+                ('/api/ingredients/?name=ингр', (IngredientViewSet, 'list'),
+                 None),
+                (f'/api/ingredients/{ingredient.pk}/',
+                 (IngredientViewSet, 'retrieve'), None),
+                ('/api/users/me/', (UserViewSet, 'me'), self.reader)):
+            with self.subTest(url=url):
+                self.assert_same(url, user, served_by=served_by)
+
+    def test_errors_fall_back_to_viewset(self):
+        missing = self.author.recipes.order_by('-pk').first().pk + 100
+        for url, headers, status in (
+                ('/api/recipes/', {'Authorization': 'Token bad'}, 401),
+                ('/api/users/me/', {'Authorization': 'Token bad'}, 401),
+                ('/api/users/me/', {}, 401),
+                ('/api/recipes/?page=99', {}, 404),
+                (f'/api/recipes/{missing}/', {}, 404),
+                ('/api/recipes/?tags=unknown', {}, 400),
+                (f'/api/tags/{self.tags[-1].pk + 100}/', {}, 404)):
+            with self.subTest(url=url, headers=headers):
+                response = self.assert_same(url, headers=headers)
+                self.assertEqual(response.status_code, status)
@@ -0,0 +1,152 @@
+"""
+Регрессионные проверки планов запросов основных эндпоинтов на заполненной
+базе: запросы не читают последовательно food_recipe, food_ingredientamount
+и food_favorite и не превышают предельную стоимость. На SQLite данных
+меньше, а стоимость не проверяется: SQLite ее не оценивает.
+"""
+import json
+import os.path
+import re
+from unittest import skipUnless
+
+from api.cache import local_cache
+from api.tests import LOCMEM_CACHES
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from food.models import Recipe
+from food.seeding import heaviest_user, seed_dataset
+from rest_framework.test import APIClient
+
+POSTGRESQL = connection.vendor == 'postgresql'
+USERS, RECIPES = (5000, 20000) if POSTGRESQL else (500, 2000)
+
+GUARDED_TABLES = ('food_recipe', 'food_ingredientamount', 'food_favorite')
+
+SCENARIOS = (
+    ('recipe_list', '/api/recipes/', 2000),
+    ('recipe_list_filtered',
+     '/api/recipes/?is_favorited=1&tags={tag}', 2000),
+    ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', 5000),
+    ('recipe_search', '/api/recipes/?search=рецепт%2012', 3000),
+    ('recipe_popular', '/api/recipes/?ordering=popular&window=week', 2000),
+    ('ingredient_search', '/api/ingredients/?name=аб', 2000),
+    ('shopping_list', '/api/recipes/download_shopping_cart/', 5000),
+)
+
+UNFILTERED_COUNT = re.compile(r'^SELECT COUNT\(\*\) AS "__count" FROM "\w+"$')
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def explain_postgresql(cursor, sql):
+    """
+    Разбирает план запроса PostgreSQL
+    @return: кортеж (оценка стоимости, таблицы с последовательным чтением,
+             использованные индексы)
+    """
+    cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    nodes = list(plan_nodes(plan[0]['Plan']))
+    seq_scans = {node.get('Relation Name') for node in nodes
+                 if node['Node Type'] == 'Seq Scan'}
+    indexes = {node['Index Name'] for node in nodes if 'Index Name' in node}
+    return nodes[0]['Total Cost'], seq_scans, indexes
+
+
+def explain_sqlite(cursor, sql):
+    """
+    Разбирает план запроса SQLite. Оценки стоимости SQLite не дает.
+    @return: кортеж (None, таблицы с последовательным чтением,
+             использованные индексы)
+    """
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+    aliases = {alias: table
+               for table, alias in re.findall(r'"(\w+)" (U\d+)', sql)}
+    seq_scans = set()
+    indexes = set()
+    for row in cursor.fetchall():
+        match = re.match(r'SCAN (\w+)(.*)', row[-1])
+        if match and 'INDEX' not in match.group(2):
+            seq_scans.add(aliases.get(match.group(1), match.group(1)))
+        indexes.update(re.findall(r'INDEX (\w+)', row[-1]))
+    return None, seq_scans, indexes
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class QueryPlanTests(TestCase):
+    """Планы запросов горячих эндпоинтов на заполненной базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_dataset(os.path.join(settings.BASE_DIR, 'data',
+                                  'ingredients.csv'),
+                     USERS, RECIPES, log=lambda message: None)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = heaviest_user()
+        cls.tag = cls.user.favorite_user.values_list(
+            'recipe__tags__slug', flat=True).first()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def capture(self, path):
+        """
+        Выполняет GET-запрос с пустым кэшем процесса
+        @return: кортеж (ответ, список SQL-запросов)
+        """
+        local_cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def explain(self, sql):
+        explain = explain_postgresql if POSTGRESQL else explain_sqlite
+        with connection.cursor() as cursor:
+            return explain(cursor, sql)
+
+    def test_hot_queries_use_indexes(self):
+        for name, path, max_cost in SCENARIOS:
+            with self.subTest(name):
+                _, queries = self.capture(path.format(tag=self.tag))
+                for sql in queries:
+                    if (not sql.startswith('SELECT')
+                            or UNFILTERED_COUNT.match(sql)):
+                        continue
+                    cost, seq_scans, _ = self.explain(sql)
+                    self.assertFalse(seq_scans & set(GUARDED_TABLES), sql)
+                    if cost is not None:
+                        self.assertLessEqual(cost, max_cost, sql)
+
+    def test_search_finds_seeded_recipes(self):
+        response, _ = self.capture('/api/recipes/?search=рецепт%2012')
+        names = [recipe['name'] for recipe in response.json()['results']]
+        self.assertTrue(names)
+        self.assertTrue(all(name.startswith('Рецепт 12') for name in names))
+
+    def test_seeded_popularity(self):
+        response, _ = self.capture('/api/recipes/?ordering=popular')
+        top = Recipe.objects.order_by('-popularity_total', '-id').first()
+        self.assertGreater(top.popularity_total, 0)
+        self.assertEqual(response.json()['results'][0]['id'], top.pk)
+
+    @skipUnless(POSTGRESQL, 'tsvector и GIN-индекс есть только в PostgreSQL')
+    def test_search_uses_gin_index(self):
+        _, queries = self.capture('/api/recipes/?search=рецепт')
+        indexes = set()
+        for sql in queries:
+            if 'search_vector' in sql:
+                indexes |= self.explain(sql)[2]
+        self.assertIn('recipe_search_vector_idx', indexes)
@@ -0,0 +1,908 @@
+import base64
+import io
+import random
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from api import async_views
+from api.filter import RecipeFilter
+from api.loadtest import SCENARIOS, LoadTest
+from api.serializers import RecipeReadSerializer
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection, transaction
+from django.test import (AsyncRequestFactory, RequestFactory, SimpleTestCase,
+                         TestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from food.catalog import bump_catalog_version
+from food.counters import counters, recount
+from food.images import FORMATS
+from food.models import (Favorite, FeedEntry, Ingredient, IngredientAmount,
+                         PopularityBucket, Recipe, ShoppingCart, Tag)
+from food.pantry import PantryIndex
+from food.popularity import bucket_start, recount_window
+from food.versions import VERSIONS_CACHE
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscribe, User
+
+LOCMEM_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'test-{alias}'}
+    for alias in ('default', VERSIONS_CACHE)
+}
+
+
+def create_recipes(author, count, tags, ingredients, prefix='Рецепт'):
+    """
+    Создает рецепты автора с тегами и ингредиентами
+    @return: список созданных рецептов
+    """
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=author, name=f'{prefix} {author.pk}-{number}',
+            text='Описание рецепта', image='recipes/test.png',
+            cooking_time=10)
+        recipe.tags.set(tags)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient,
+                             amount=number + 1)
+            for ingredient in ingredients)
+        recipes.append(recipe)
+    return recipes
+
+
+def png_base64(size=(8, 8)):
+    """
+    @param size: размер картинки
+    @return: PNG в виде data URI, как его присылает фронтенд
+    """
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ApiTestCase(TestCase):
+    """Пользователи, теги и ингредиенты для тестов API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com', password='pass')
+        cls.tags = [Tag.objects.create(name=name, color=color)
+                    for name, color in (('Завтрак', '#E26C2D'),
+                                        ('Обед', '#49B64E'),
+                                        ('Ужин', '#8775D2'))]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(5)]
+
+    def client_for(self, user=None):
+        """
+        @param user: пользователь или None для анонимного клиента
+        @return: APIClient с токеном пользователя
+        """
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def recipe_payload(self, *numbers, image=None):
+        """
+        @param numbers: номера ингредиентов из self.ingredients
+        @param image: картинка в виде data URI, по умолчанию PNG 8x8
+        @return: данные для создания рецепта через API
+        """
+        return {
+            'name': 'Рецепт из API', 'text': 'Описание рецепта',
+            'cooking_time': 10, 'image': image or png_base64(),
+            'tags': [self.tags[0].pk],
+            'ingredients': [{'id': self.ingredients[number].pk, 'amount': 1}
+                            for number in numbers]}
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+
+class QueryCountTests(ApiTestCase):
+    """Число запросов не зависит от объема данных."""
+
+    def assert_constant(self, url, user, expected, grow):
+        """
+        Проверяет число запросов до и после grow()
+        @param url: адрес GET-запроса
+        @param user: пользователь или None
+        @param expected: ожидаемое число запросов
+        @param grow: функция, добавляющая данные
+        """
+        client = self.client_for(user)
+        self.assertEqual(self.count_queries(client, url), expected)
+        grow()
+        with self.assertNumQueries(expected):
+            self.assertEqual(client.get(url).status_code, 200)
+
+    def test_recipe_list(self):
+        create_recipes(self.author, 2, self.tags, self.ingredients)
+        for user, expected in ((None, 6), (self.reader, 7)):
+            with self.subTest(user=user):
+                self.assert_constant(
+                    '/api/recipes/?limit=20', user, expected,
+                    lambda: create_recipes(self.author, 5, self.tags,
+                                           self.ingredients,
+                                           prefix=f'Еще {user}'))
+
+    def test_recipe_detail(self):
+        recipe = create_recipes(self.author, 1, self.tags[:1],
+                                self.ingredients[:1])[0]
+
+        def grow():
+            recipe.tags.set(self.tags)
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(recipe=recipe, ingredient=ingredient,
+                                 amount=1)
+                for ingredient in self.ingredients[1:])
+
+        for user, expected in ((None, 5), (self.reader, 6)):
+            with self.subTest(user=user):
+                recipe.tags.set(self.tags[:1])
+                IngredientAmount.objects.filter(recipe=recipe).exclude(
+                    ingredient=self.ingredients[0]).delete()
+                self.assert_constant(f'/api/recipes/{recipe.pk}/', user,
+                                     expected, grow)
+
+    def test_download_shopping_cart(self):
+        recipes = create_recipes(self.author, 30, self.tags,
+                                 self.ingredients)
+        ShoppingCart.objects.create(user=self.reader, recipe=recipes[0])
+
+        def grow():
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=self.reader, recipe=recipe)
+                for recipe in recipes[1:])
+
+        client = self.client_for(self.reader)
+        url = '/api/recipes/download_shopping_cart/'
+        with self.assertNumQueries(2):
+            b''.join(client.get(url).streaming_content)
+        grow()
+        with self.assertNumQueries(2):
+            content = b''.join(client.get(url).streaming_content)
+        self.assertIn('* Ингредиент 0 (г) - 465\n'.encode(), content)
+
+
+class ConditionalGetTests(ApiTestCase):
+    """Совпавший ETag отдает 304 без сериализации."""
+
+    def assert_not_modified(self, url, user):
+        client = self.client_for(user)
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        with mock.patch.object(RecipeReadSerializer,
+                               'to_representation') as to_representation:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        to_representation.assert_not_called()
+
+    def test_not_modified(self):
+        recipe = create_recipes(self.author, 3, self.tags,
+                                self.ingredients)[0]
+        for url in ('/api/recipes/', f'/api/recipes/{recipe.pk}/'):
+            for user in (None, self.reader):
+                with self.subTest(url=url, user=user):
+                    self.assert_not_modified(url, user)
+
+    def test_login_keeps_etag(self):
+        create_recipes(self.author, 2, self.tags, self.ingredients)
+        client = self.client_for()
+        etag = client.get('/api/recipes/')['ETag']
+        response = APIClient().post(
+            '/api/auth/token/login/',
+            {'email': 'reader@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 200)
+        response = client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        response = client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_star_does_not_match_missing_recipe(self):
+        recipe = create_recipes(self.author, 1, self.tags,
+                                self.ingredients)[0]
+        client = self.client_for(self.reader)
+        for pk, expected in ((recipe.pk, 304), (recipe.pk + 100, 404)):
+            with self.subTest(pk=pk):
+                response = client.get(f'/api/recipes/{pk}/',
+                                      HTTP_IF_NONE_MATCH='*')
+                self.assertEqual(response.status_code, expected)
+
+    async def test_star_does_not_match_missing_recipe_async(self):
+        request = AsyncRequestFactory().get(
+            '/api/recipes/999/', headers={'If-None-Match': '*'})
+        response = await async_views.recipe_detail(request, pk=999)
+        self.assertEqual(response.status_code, 404)
+
+    def test_modified_after_change(self):
+        recipe = create_recipes(self.author, 1, self.tags,
+                                self.ingredients)[0]
+        client = self.client_for(self.reader)
+        url = f'/api/recipes/{recipe.pk}/'
+        etag = client.get(url)['ETag']
+        recipe.name = 'Новое название'
+        recipe.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class IngredientSearchTests(ApiTestCase):
+    """Поиск ингредиентов по префиксу идет мимо кэша ответов."""
+
+    def setUp(self):
+        # Индекс процесса мог остаться от каталога откаченного теста
+        bump_catalog_version()
+
+    def test_prefix_search_skips_cache(self):
+        client = self.client_for()
+        with mock.patch('api.cache.cache') as shared_cache:
+            response = client.get('/api/ingredients/', {'name': 'ингр'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), len(self.ingredients))
+        self.assertEqual(shared_cache.mock_calls, [])
+
+    def names(self, query):
+        response = self.client_for().get('/api/ingredients/', {'name': query})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def create_ingredients(self, *names):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г') for name in names)
+        bump_catalog_version()
+
+    def test_translit_and_typo(self):
+        self.create_ingredients('Картофель', 'Абрикосовый джем', 'Капуста')
+        self.assertEqual(self.names('kartofel'), ['Картофель'])
+        self.assertEqual(self.names('обрикосовый'), ['Абрикосовый джем'])
+
+    def test_similar_after_prefix_hits(self):
+        self.create_ingredients('Морковный сок', 'Морковь', 'Морковка',
+                                'Редис')
+        self.assertEqual(self.names('морковь'),
+                         ['Морковь', 'Морковка', 'Морковный сок'])
+        with mock.patch('food.catalog.FUZZY_LIMIT', 2):
+            self.assertEqual(self.names('морковь'), ['Морковь', 'Морковка'])
+            self.assertEqual(self.names('морков'),
+                             ['Морковка', 'Морковный сок', 'Морковь'])
+
+    def test_catalog_change_rebuilds_index(self):
+        self.assertEqual(self.names('kartofel'), [])
+        Ingredient.objects.create(name='Картофель', measurement_unit='г')
+        self.assertEqual(self.names('kartofel'), ['Картофель'])
+        Ingredient.objects.filter(name='Картофель').update(name='Батат')
+        bump_catalog_version()
+        self.assertEqual(self.names('kartofel'), [])
+        self.assertEqual(self.names('бат'), ['Батат'])
+
+    def test_full_list_is_cached(self):
+        client = self.client_for()
+        self.assertEqual(len(client.get('/api/ingredients/').json()),
+                         len(self.ingredients))
+        with self.assertNumQueries(0):
+            response = client.get('/api/ingredients/')
+        self.assertEqual(len(response.json()), len(self.ingredients))
+
+
+class TagFilterTests(ApiTestCase):
+    """Фильтр по нескольким тегам не дублирует рецепты."""
+
+    def test_several_tags_without_duplicates(self):
+        both = create_recipes(self.author, 3, self.tags[:2],
+                              self.ingredients)
+        single = create_recipes(self.author, 2, self.tags[1:2],
+                                self.ingredients, prefix='Обед')
+        create_recipes(self.author, 2, self.tags[2:], self.ingredients,
+                       prefix='Ужин')
+        response = self.client_for().get(
+            '/api/recipes/',
+            {'tags': [tag.slug for tag in self.tags[:2]], 'limit': 50})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.json()['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertCountEqual(ids, [recipe.pk for recipe in both + single])
+
+    def test_tags_filter_uses_exists(self):
+        request = RequestFactory().get(
+            '/api/recipes/', {'tags': [tag.slug for tag in self.tags]})
+        request.user = AnonymousUser()
+        queryset = RecipeFilter(request.GET, queryset=Recipe.objects.all(),
+                                request=request).qs
+        sql = str(queryset.query).upper()
+        outer, _, subquery = sql.partition('EXISTS')
+        self.assertIn('FOOD_TAGRECIPE', subquery)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn('JOIN', outer)
+
+
+class RecipeSearchTests(ApiTestCase):
+    """Полнотекстовый поиск видит созданные и измененные рецепты."""
+
+    def search(self, text):
+        response = self.client_for().get('/api/recipes/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_finds_created_recipe(self):
+        recipe = create_recipes(self.author, 1, self.tags, self.ingredients,
+                                prefix='Борщ')[0]
+        create_recipes(self.author, 2, self.tags, self.ingredients,
+                       prefix='Салат')
+        self.assertEqual(self.search('борщ'), [recipe.pk])
+        recipe.name = 'Окрошка на квасе'
+        recipe.save()
+        self.assertEqual(self.search('окрошка'), [recipe.pk])
+        self.assertEqual(self.search('борщ'), [])
+
+    def test_words_are_prefixes(self):
+        recipe = create_recipes(self.author, 1, self.tags, self.ingredients,
+                                prefix='Окрошка на квасе')[0]
+        create_recipes(self.author, 1, self.tags, self.ingredients,
+                       prefix='Окунь')
+        self.assertEqual(self.search('окро'), [recipe.pk])
+        self.assertEqual(self.search('кв окрош'), [recipe.pk])
+        self.assertEqual(self.search('окрошка уха'), [])
+        self.assertEqual(self.search('*:& !'), self.search(''))
+
+    def test_word_forms(self):
+        recipe = create_recipes(self.author, 1, self.tags, self.ingredients,
+                                prefix='Борщ')[0]
+        found = self.search('борща')
+        if connection.vendor == 'postgresql':
+            # Стемминг словаря russian
+            self.assertEqual(found, [recipe.pk])
+        else:
+            # В FTS5 стемминга нет: слово запроса длиннее слова в тексте
+            self.assertEqual(found, [])
+
+
+class FeedTests(ApiTestCase):
+    """Лента подписок в обоих режимах и переход между ними."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [User.objects.create_user(
+            username=f'feed{number}', email=f'feed{number}@example.com',
+            password='pass') for number in range(3)]
+        for author in cls.authors:
+            create_recipes(author, 3, cls.tags, cls.ingredients)
+        Recipe.objects.update(pub_date=timezone.now())
+
+    def subscribe(self, author, method='post'):
+        client = self.client_for(self.reader)
+        response = getattr(client, method)(
+            f'/api/users/{author.pk}/subscribe/')
+        self.assertIn(response.status_code, (201, 204))
+
+    def entries(self):
+        """
+        @return: множество пар (id автора, id рецепта) из ленты читателя
+        """
+        return set(FeedEntry.objects.filter(user=self.reader).values_list(
+            'author_id', 'recipe_id'))
+
+    def recipes_of(self, *authors):
+        return set(Recipe.objects.filter(author__in=authors).values_list(
+            'author_id', 'id'))
+
+    def walk(self, limit=2):
+        """
+        Проходит ленту по ссылкам next, а затем обратно по previous
+        @return: кортеж (id рецептов вперед, id рецептов назад)
+        """
+        client = self.client_for(self.reader)
+        forward, pages = [], []
+        url = f'/api/users/feed/?limit={limit}'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            pages.append([recipe['id'] for recipe in data['results']])
+            forward += pages[-1]
+            url = data['next']
+        backward = []
+        url = data['previous']
+        while url:
+            data = client.get(url).json()
+            backward = [recipe['id'] for recipe in data['results']] + backward
+            url = data['previous']
+        self.assertEqual(backward, forward[:len(forward) - len(pages[-1])])
+        return forward, backward
+
+    def expected_feed(self, *authors):
+        return list(Recipe.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+
+    @override_settings(FEED_MATERIALIZE_THRESHOLD=2)
+    def test_materialized_after_threshold(self):
+        self.subscribe(self.authors[0])
+        self.reader.refresh_from_db()
+        self.assertFalse(self.reader.feed_materialized)
+        self.assertEqual(self.entries(), set())
+
+        self.subscribe(self.authors[1])
+        self.reader.refresh_from_db()
+        self.assertTrue(self.reader.feed_materialized)
+        self.assertEqual(self.entries(), self.recipes_of(*self.authors[:2]))
+
+        self.subscribe(self.authors[2])
+        self.assertEqual(self.entries(), self.recipes_of(*self.authors))
+
+    @override_settings(FEED_MATERIALIZE_THRESHOLD=2)
+    def test_fan_out_to_materialized_feed(self):
+        for author in self.authors[:2]:
+            self.subscribe(author)
+        recipe = create_recipes(self.authors[0], 1, self.tags,
+                                self.ingredients, prefix='Новый')[0]
+        self.assertIn((self.authors[0].pk, recipe.pk), self.entries())
+        create_recipes(self.authors[2], 1, self.tags, self.ingredients,
+                       prefix='Чужой')
+        self.assertEqual(self.entries(), self.recipes_of(*self.authors[:2]))
+
+    @override_settings(FEED_MATERIALIZE_THRESHOLD=4)
+    def test_unsubscribe_trims_then_dematerializes(self):
+        for author in self.authors:
+            self.subscribe(author)
+        self.subscribe(self.author)
+        self.reader.refresh_from_db()
+        self.assertTrue(self.reader.feed_materialized)
+
+        self.subscribe(self.authors[0], method='delete')
+        self.assertEqual(self.entries(), self.recipes_of(*self.authors[1:]))
+
+        self.subscribe(self.authors[1], method='delete')
+        self.subscribe(self.authors[2], method='delete')
+        self.reader.refresh_from_db()
+        self.assertFalse(self.reader.feed_materialized)
+        self.assertEqual(self.entries(), set())
+        forward, _ = self.walk()
+        self.assertEqual(forward, [])
+
+    def test_keyset_paging_in_both_modes(self):
+        for threshold, materialized in ((100, False), (1, True)):
+            settings = override_settings(FEED_MATERIALIZE_THRESHOLD=threshold)
+            with self.subTest(materialized=materialized), settings:
+                for author in self.authors:
+                    self.subscribe(author)
+                self.reader.refresh_from_db()
+                self.assertEqual(self.reader.feed_materialized, materialized)
+                forward, _ = self.walk()
+                self.assertEqual(forward, self.expected_feed(*self.authors))
+                for author in self.authors:
+                    self.subscribe(author, method='delete')
+
+
+class PantryTests(ApiTestCase):
+    """Подбор рецептов по ингредиентам и обновление индекса."""
+
+    def setUp(self):
+        self.created = 0
+        self.index = PantryIndex()
+        for module in ('api.views', 'api.serializers', 'food.signals'):
+            patcher = mock.patch(f'{module}.pantry_index', self.index)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def recipe_with(self, *numbers):
+        """
+        @param numbers: номера ингредиентов из self.ingredients
+        @return: рецепт с этими ингредиентами
+        """
+        self.created += 1
+        return create_recipes(
+            self.author, 1, self.tags,
+            [self.ingredients[number] for number in numbers],
+            prefix=f'Рецепт {self.created}')[0]
+
+    def cook(self, *numbers, missing=0):
+        """
+        @return: результаты подбора по ингредиентам с номерами numbers
+        """
+        response = self.client_for().get('/api/recipes/cook/', {
+            'ingredients': [self.ingredients[number].pk
+                            for number in numbers],
+            'missing': missing, 'limit': 50})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def cooked_ids(self, *numbers, missing=0):
+        return [recipe['id'] for recipe in self.cook(*numbers,
+                                                     missing=missing)]
+
+    def test_ranking_and_missing(self):
+        pair = self.recipe_with(0, 1)
+        triple = self.recipe_with(0, 1, 2)
+        four = self.recipe_with(0, 1, 2, 3)
+        self.recipe_with(3, 4)
+        self.assertEqual(self.cooked_ids(0, 1, 2), [triple.pk, pair.pk])
+        results = self.cook(0, 1, 2, missing=1)
+        self.assertEqual([recipe['id'] for recipe in results],
+                         [triple.pk, pair.pk, four.pk])
+        self.assertEqual(
+            (results[2]['matched_count'], results[2]['missing_count'],
+             results[2]['missing_ingredients']),
+            (3, 1, [self.ingredients[3].pk]))
+        self.assertEqual(self.cooked_ids(0, missing=1), [pair.pk])
+
+    def test_create_and_update_through_api(self):
+        self.recipe_with(0, 1)
+        self.assertEqual(self.cooked_ids(2, 3), [])
+        client = self.client_for(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/recipes/', self.recipe_payload(2, 3),
+                                   format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe_id = response.json()['id']
+        with mock.patch.object(self.index, '_catch_up'):
+            self.assertEqual(self.cooked_ids(2, 3), [recipe_id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/recipes/{recipe_id}/',
+                                    self.recipe_payload(4), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cooked_ids(2, 3), [])
+        self.assertEqual(self.cooked_ids(4), [recipe_id])
+
+    def test_deleted_recipe_is_discarded(self):
+        kept = self.recipe_with(0)
+        deleted = self.recipe_with(0)
+        self.assertEqual(self.cooked_ids(0), [deleted.pk, kept.pk])
+        with self.captureOnCommitCallbacks(execute=False):
+            Recipe.objects.filter(pk=deleted.pk).delete()
+        self.assertEqual(self.cooked_ids(0), [kept.pk])
+        self.assertEqual(
+            [match.recipe_id for match in self.index.search({
+                self.ingredients[0].pk})],
+            [kept.pk])
+
+    def test_catch_up_after_version_bump(self):
+        recipe = self.recipe_with(0, 1)
+        self.assertEqual(self.cooked_ids(0, 1), [recipe.pk])
+        other = PantryIndex()
+        other.refresh()
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientAmount.objects.filter(recipe=recipe).delete()
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=self.ingredients[2], amount=1)
+            recipe.save()
+        with mock.patch.object(other, '_build') as build:
+            self.assertEqual(
+                [match.recipe_id for match in other.search({
+                    self.ingredients[2].pk})],
+                [recipe.pk])
+        build.assert_not_called()
+        self.assertEqual(other.search({self.ingredients[0].pk}), [])
+
+
+class CursorPaginationTests(ApiTestCase):
+    """Курсор по составной позиции листает группы с одинаковой датой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        create_recipes(cls.author, 16, cls.tags, cls.ingredients)
+        ties = list(Recipe.objects.values_list('id', flat=True)[:13])
+        Recipe.objects.filter(id__in=ties).update(pub_date=timezone.now())
+
+    def walk(self, url):
+        """
+        Проходит список по ссылкам next, а затем обратно по previous
+        @return: кортеж (id вперед, id назад, страницы)
+        """
+        client = self.client_for()
+        forward, pages = [], []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            if not pages:
+                self.assertIsNone(data['previous'])
+            pages.append([item['id'] for item in data['results']])
+            forward += pages[-1]
+            url = data['next']
+        backward = list(pages[-1])
+        url = data['previous']
+        while url:
+            data = client.get(url).json()
+            backward = [item['id'] for item in data['results']] + backward
+            url = data['previous']
+        return forward, backward, pages
+
+    def test_recipes_with_equal_pub_date(self):
+        forward, backward, pages = self.walk(
+            '/api/recipes/?pagination=cursor&limit=4')
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 4])
+
+    def test_users_by_id(self):
+        forward, backward, _ = self.walk(
+            '/api/users/?pagination=cursor&limit=1')
+        expected = list(User.objects.order_by('id').values_list(
+            'id', flat=True))
+        self.assertEqual(forward, expected)
+        self.assertEqual(backward, expected)
+        response = self.client_for().get(
+            '/api/users/', {'pagination': 'cursor', 'limit': 1})
+        cursor = parse_qs(urlparse(response.json()['next']).query)['cursor']
+        position = parse_qs(base64.b64decode(cursor[0]).decode())['p']
+        self.assertEqual(position, [str(expected[0])])
+
+    def test_tampered_cursor(self):
+        for position in ('1', '1|2|3', 'дата|1'):
+            cursor = base64.b64encode(urlencode({'p': position}).encode())
+            with self.subTest(position=position):
+                response = self.client_for().get(
+                    '/api/recipes/', {'cursor': cursor.decode()})
+                self.assertEqual(response.status_code, 404)
+
+
+class CounterTests(ApiTestCase):
+    """Денормализованные счетчики и их пересчет."""
+
+    def subscriptions(self):
+        response = self.client_for(self.reader).get(
+            '/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        return {author['id']: author['recipes_count']
+                for author in response.json()['results']}
+
+    def test_recipes_count_outside_api(self):
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        recipes = create_recipes(self.author, 4, self.tags, self.ingredients)
+        self.assertEqual(self.subscriptions(), {self.author.pk: 4})
+
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{recipes[0].pk}/')
+        self.assertEqual(response.status_code, 204)
+        recipes[1].delete()
+        self.assertEqual(self.subscriptions(), {self.author.pk: 2})
+
+    def test_failed_delete_keeps_recipes_count(self):
+        recipe = create_recipes(self.author, 1, self.tags,
+                                self.ingredients)[0]
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                recipe.delete()
+                self.author.refresh_from_db()
+                self.assertEqual(self.author.recipes_count, 0)
+                raise RuntimeError
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 1)
+        self.assertTrue(Recipe.objects.filter(author=self.author).exists())
+
+    def test_recount_repairs_counters(self):
+        recipe = create_recipes(self.author, 2, self.tags,
+                                self.ingredients)[0]
+        Favorite.objects.create(user=self.reader, recipe=recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        Subscribe.objects.create(user=self.reader, author=self.author)
+        User.objects.update(recipes_count=7, subscribers_count=7)
+        Recipe.objects.update(favorites_count=7, in_carts_count=7)
+
+        fixed = {field: recount(model, field, related_model, fk_field)
+                 for model, field, related_model, fk_field in counters()}
+        self.assertEqual(fixed, {'favorites_count': 2, 'in_carts_count': 2,
+                                 'recipes_count': 2, 'subscribers_count': 2})
+        self.author.refresh_from_db()
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (self.author.recipes_count, self.author.subscribers_count,
+             recipe.favorites_count, recipe.in_carts_count),
+            (2, 1, 1, 1))
+        self.assertEqual(
+            [recount(*counter) for counter in counters()], [0, 0, 0, 0])
+
+
+class PopularityTests(ApiTestCase):
+    """Популярность за окна, сортировка по ней и ETag."""
+
+    def setUp(self):
+        self.recipes = create_recipes(self.author, 3, self.tags,
+                                      self.ingredients)
+        for recipe, (day, week, total) in zip(
+                self.recipes, ((3, 3, 3), (0, 5, 5), (0, 0, 9))):
+            Recipe.objects.filter(pk=recipe.pk).update(
+                popularity_day=day, popularity_week=week,
+                popularity_total=total)
+
+    def popularity(self, recipe):
+        return tuple(Recipe.objects.filter(pk=recipe.pk).values_list(
+            'popularity_day', 'popularity_week', 'popularity_total',
+            'favorites_count', 'in_carts_count').get())
+
+    def popular_ids(self, window, **params):
+        response = self.client_for().get(
+            '/api/recipes/', {'ordering': 'popular', 'window': window,
+                              **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_favorite_and_cart_change_popularity(self):
+        recipe = self.recipes[2]
+        client = self.client_for(self.reader)
+        for action in ('favorite', 'shopping_cart'):
+            response = client.post(f'/api/recipes/{recipe.pk}/{action}/')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.popularity(recipe), (2, 2, 11, 1, 1))
+        self.assertEqual(
+            PopularityBucket.objects.get(recipe=recipe).score, 2)
+
+        response = client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.popularity(recipe), (1, 1, 10, 0, 1))
+        response = client.delete(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.popularity(recipe), (1, 1, 10, 0, 1))
+
+    def test_ordering_by_window(self):
+        day, week, total = self.recipes
+        self.assertEqual(self.popular_ids('day'), [day.pk, total.pk, week.pk])
+        self.assertEqual(self.popular_ids('week'),
+                         [week.pk, day.pk, total.pk])
+        self.assertEqual(self.popular_ids('all'),
+                         [total.pk, week.pk, day.pk])
+        self.assertEqual(self.popular_ids(''), [total.pk, week.pk, day.pk])
+
+    def test_cursor_by_popularity(self):
+        day, week, total = self.recipes
+        client = self.client_for()
+        url = '/api/recipes/?ordering=popular&window=week&pagination=cursor'
+        response = client.get(url + '&limit=1')
+        cursor = parse_qs(urlparse(response.json()['next']).query)['cursor']
+        position = parse_qs(base64.b64decode(cursor[0]).decode())['p']
+        self.assertEqual(position, [f'5|{week.pk}'])
+        ids = []
+        url += '&limit=1'
+        while url:
+            data = client.get(url).json()
+            ids += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        self.assertEqual(ids, [week.pk, day.pk, total.pk])
+
+    def test_etag_follows_popularity(self):
+        popular = '/api/recipes/?ordering=popular'
+        anonymous = self.client_for()
+        etags = {url: anonymous.get(url)['ETag']
+                 for url in (popular, '/api/recipes/')}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client_for(self.reader).post(
+                f'/api/recipes/{self.recipes[0].pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        response = anonymous.get(popular, HTTP_IF_NONE_MATCH=etags[popular])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etags[popular])
+        response = anonymous.get('/api/recipes/',
+                                 HTTP_IF_NONE_MATCH=etags['/api/recipes/'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_recount_window(self):
+        day, week, total = self.recipes
+        now = timezone.now()
+        PopularityBucket.objects.bulk_create([
+            PopularityBucket(recipe=day, start=bucket_start(now), score=2),
+            PopularityBucket(recipe=day, start=bucket_start(
+                now - timedelta(days=3)), score=4),
+        ])
+        self.assertEqual(
+            recount_window('popularity_day', now - timedelta(days=1)), 1)
+        self.assertEqual(
+            recount_window('popularity_week', now - timedelta(days=7)), 2)
+        self.assertEqual(
+            [self.popularity(recipe)[:2] for recipe in self.recipes],
+            [(2, 6), (0, 0), (0, 0)])
+        self.assertEqual(
+            recount_window('popularity_week', now - timedelta(days=7)), 0)
+
+
+class ImageSrcsetTests(ApiTestCase):
+    """srcset перечисляет каждую ширину картинки один раз."""
+
+    def test_small_image_srcset(self):
+        recipe = create_recipes(self.author, 1, self.tags,
+                                self.ingredients)[0]
+        files = {key: f'recipes/{key}.{key}' for key in FORMATS}
+        Recipe.objects.filter(pk=recipe.pk).update(image_variants={
+            'thumbnail': {'width': 160, **files},
+            'card': {'width': 400, **files},
+            'full': {'width': 400, **files}})
+        response = self.client_for().get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['image_srcset'], {
+            key: (f'http://testserver/media/{name} 160w, '
+                  f'http://testserver/media/{name} 400w')
+            for key, name in files.items()})
+
+
+class RecipeImageUploadTests(ApiTestCase):
+    """Загрузка картинки рецепта проверяет, что это изображение."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def post(self, image):
+        return self.client_for(self.author).post(
+            '/api/recipes/', self.recipe_payload(0, image=image),
+            format='json')
+
+    def test_image_accepted(self):
+        response = self.post(png_base64())
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_PENDING)
+        with recipe.image.open() as file:
+            self.assertEqual(Image.open(file).size, (8, 8))
+
+    def test_not_an_image_rejected(self):
+        png = base64.b64decode(png_base64().partition(',')[2])
+        for content in (b'<?php echo 1; ?>', png[:40]):
+            encoded = base64.b64encode(content).decode()
+            with self.subTest(content=content[:8]):
+                response = self.post(f'data:image/png;base64,{encoded}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.json())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class LoadTestScenarioTests(SimpleTestCase):
+    """Парные сценарии нагрузочного теста не удаляют чужие связи."""
+
+    def run_pair(self, add_status):
+        """
+        Выполняет сценарий favorite-add/remove с заданным статусом POST
+        @return: методы выполненных запросов
+        """
+        load_test = LoadTest('http://testserver/')
+        load_test.tokens = ['token']
+        load_test.values = {'recipe': [1]}
+        load_test.request = mock.Mock(
+            side_effect=lambda method, path, token=None: (
+                add_status if method == 'POST' else 204, b''))
+        pair = next(scenario for scenario in SCENARIOS
+                    if scenario.steps[0].name == 'favorite-add')
+        load_test.run_scenario(random.Random(0), pair)
+        return [call.args[0] for call in load_test.request.call_args_list]
+
+    def test_remove_follows_successful_add(self):
+        self.assertEqual(self.run_pair(201), ['POST', 'DELETE'])
+
+    def test_remove_skipped_when_add_failed(self):
+        self.assertEqual(self.run_pair(400), ['POST'])
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -10,7 +11,15 @@ router.register(r'users', views.UserViewSet, basename='users')
 router.register(r'ingredients', views.IngredientViewSet,
                 basename='ingredients')
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_READS:
+    from . import async_views
+
+    urlpatterns += async_views.urlpatterns
+
+urlpatterns += [
     path('', include(router.urls)),
     path(r'auth/', include('djoser.urls.authtoken')),
+    path('db-pool/', views.db_pool_stats, name='db-pool'),
 ]
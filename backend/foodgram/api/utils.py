@@ -1,5 +1,13 @@
 import dataclasses
+import hashlib
 
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import Max
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
+from food.counters import change_counter
+from food.versions import bump_version, get_version, user_state
 from rest_framework import status
 from rest_framework.response import Response
 
@@ -7,6 +15,7 @@ from rest_framework.response import Response
 @dataclasses.dataclass
 class CreateDeleteMixin:
     lookup_field = None
+    counter_field = None
     serializer_class = None
     format_kwarg = None
 
@@ -22,7 +31,10 @@ class CreateDeleteMixin:
             )
 
         if request.method == 'DELETE':
-            instance.delete()
+            with transaction.atomic():
+                deleted, _ = instance.delete()
+                change_counter(obj, self.counter_field, -deleted)
+            bump_version(user_state(request.user))
             return Response({'detail': f'Успешное удаление из {name} листа.'},
                             status=status.HTTP_204_NO_CONTENT)
 
@@ -32,7 +44,11 @@ class CreateDeleteMixin:
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        model.objects.create(user=request.user, **{self.lookup_field: obj})
+        with transaction.atomic():
+            model.objects.create(user=request.user,
+                                 **{self.lookup_field: obj})
+            change_counter(obj, self.counter_field, 1)
+        bump_version(user_state(request.user))
         serializer = self.serializer_class(
             obj,
             context={
@@ -42,3 +58,115 @@ class CreateDeleteMixin:
             }
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ConditionalGetMixin:
+    """
+    Отвечает 304 Not Modified на GET списка и объекта, если ETag совпал
+    с If-None-Match, до сериализации. ETag строится из максимального
+    last_modified_field отфильтрованного набора (один запрос), меток версий
+    version_names и состояния текущего пользователя.
+    """
+    last_modified_field = 'updated_at'
+    version_names = ()
+
+    def get_etag(self, queryset):
+        """
+        Вычисляет ETag и время последнего изменения набора объектов
+        @param queryset: отфильтрованный queryset без аннотаций
+        @return: кортеж (ETag, время изменения или None)
+        """
+        last_modified = queryset.order_by().aggregate(
+            last_modified=Max(self.last_modified_field))['last_modified']
+        return self.build_etag(last_modified), last_modified
+
+    async def aget_etag(self, queryset):
+        """
+        Асинхронный вариант get_etag
+        """
+        result = await queryset.order_by().aaggregate(
+            last_modified=Max(self.last_modified_field))
+        last_modified = result['last_modified']
+        etag = await sync_to_async(self.build_etag)(last_modified)
+        return etag, last_modified
+
+    def build_etag(self, last_modified):
+        user = self.request.user
+        parts = [self.request.get_full_path(), last_modified]
+        parts += [get_version(name) for name in self.version_names]
+        if user.is_authenticated:
+            parts += [user.pk, get_version(user_state(user))]
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return quote_etag(digest)
+
+    def is_not_modified(self, etag, last_modified):
+        """
+        Сравнивает ETag с If-None-Match. «*» совпадает, только если
+        представление существует (RFC 9110): для отсутствующего объекта
+        нужен 404, а не 304.
+        @param etag: текущий ETag
+        @param last_modified: время изменения набора, None - набор пуст
+        @return: True, если можно ответить 304
+        """
+        if_none_match = parse_etags(
+            self.request.headers.get('If-None-Match', ''))
+        return etag in if_none_match or (
+            '*' in if_none_match and last_modified is not None)
+
+    def add_validators(self, response, etag, last_modified):
+        """
+        Добавляет ETag и Last-Modified к успешному ответу
+        @return: тот же объект ответа
+        """
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(
+                    last_modified.timestamp())
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def conditional_response(self, queryset, render):
+        """
+        Возвращает 304 при совпадении ETag, иначе результат render()
+        @param queryset: отфильтрованный queryset для вычисления версии
+        @param render: функция, формирующая полный ответ
+        @return: объект Response
+        """
+        etag, last_modified = self.get_etag(queryset)
+        if self.is_not_modified(etag, last_modified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = render()
+        return self.add_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.queryset.all())
+        return self.conditional_response(
+            queryset, lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.queryset.all()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError):
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(
+            queryset, lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs))
+
+
+def shopping_list_lines(ingredients):
+    """
+    Построчно формирует список покупок
+    @param ingredients: queryset с полями ingredient__name,
+                        ingredient__measurement_unit и total
+    @return: генератор строк списка покупок.
+    """
+    for item in ingredients.iterator():
+        yield (f'* {item["ingredient__name"]} '
+               f'({item["ingredient__measurement_unit"]}) - '
+               f'{item["total"]}\n')
@@ -1,24 +1,74 @@
-from api.filter import RecipeFilter
-from api.pagination import CustomPaginator
+import os
+
+from api.cache import RenderedCacheMixin
+from api.filter import RecipeFilter, popularity_field
+from api.pagination import (CustomPaginator, FeedCursorPaginator,
+                            LimitPageNumberPaginator)
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (IngredientSerializer, RecipeCreateSerializer,
+from api.serializers import (IngredientSerializer, PantryRecipeSerializer,
+                             PantrySerializer, RecipeCreateSerializer,
                              RecipeReadSerializer, RecipeSerializer,
-                             SetPasswordSerializer, SubscribeAuthorSerializer,
+                             RecipesLimitSerializer, SetPasswordSerializer,
+                             SubscribeAuthorSerializer,
                              SubscriptionsSerializer, TagSerializer,
                              UserCreateSerializer, UserReadSerializer)
-from api.utils import CreateDeleteMixin
-from django.http import FileResponse
+from api.utils import (ConditionalGetMixin, CreateDeleteMixin,
+                       shopping_list_lines)
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, Window)
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from food.catalog import CATALOG, ingredient_index
+from food.counters import change_counter
+from food.feed import feed_recipes
 from food.models import (Favorite, Ingredient, IngredientAmount, Recipe,
                          ShoppingCart, Tag)
+from food.pantry import pantry_index
+from food.popularity import POPULARITY, change_popularity
+from food.versions import bump_version, user_state
+from foodgram.postgresql_pool.base import pool_stats
 from rest_framework import filters, mixins, status, viewsets
-from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from users.models import Subscribe, User
 
 
+def readable_recipes(queryset, user):
+    """
+    Дополняет рецепты флагами текущего пользователя и заранее подгружает
+    автора, теги и ингредиенты одним набором запросов
+    @param queryset: queryset рецептов
+    @param user: текущий пользователь
+    @return: queryset рецептов для RecipeReadSerializer
+    """
+    if user.is_authenticated:
+        is_favorite = Exists(Favorite.objects.filter(
+            user=user, recipe=OuterRef('pk')))
+        is_in_shopping_cart = Exists(ShoppingCart.objects.filter(
+            user=user, recipe=OuterRef('pk')))
+        is_subscribed = Exists(Subscribe.objects.filter(
+            user=user, author=OuterRef('pk')))
+    else:
+        is_favorite = is_in_shopping_cart = is_subscribed = Value(
+            False, output_field=BooleanField())
+    return queryset.annotate(
+        is_favorite=is_favorite,
+        is_in_shopping_cart=is_in_shopping_cart,
+    ).prefetch_related(
+        Prefetch('author', queryset=User.objects.annotate(
+            is_subscribed=is_subscribed)),
+        'tags',
+        Prefetch('recipes', queryset=IngredientAmount.objects
+                 .select_related('ingredient')),
+    )
+
+
 class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
                   mixins.RetrieveModelMixin, viewsets.GenericViewSet,
                   CreateDeleteMixin):
@@ -41,6 +91,22 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
             return UserReadSerializer
         return UserCreateSerializer
 
+    def get_queryset(self):
+        """
+        Для чтения дополняет пользователей флагом подписки текущего
+        пользователя.
+        @return: queryset пользователей
+        """
+        queryset = super().get_queryset()
+        user = self.request.user
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField()))
+        return queryset.annotate(is_subscribed=Exists(
+            Subscribe.objects.filter(user=user, author=OuterRef('pk'))))
+
     @action(detail=False, methods=['GET'], pagination_class=None,
             permission_classes=(IsAuthenticated,))
     def me(self, request):
@@ -81,10 +147,44 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         @return: объект Response с данными подписок текущего пользователя и
                  статусом HTTP_200_OK.
         """
-        queryset = User.objects.filter(subscribing__user=request.user)
+        params = RecipesLimitSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        recipes_limit = params.validated_data.get('recipes_limit')
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=F('pub_date').desc(),
+            )).filter(row_number__lte=recipes_limit)
+        queryset = User.objects.filter(
+            subscribing__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by('id')
         page = self.paginate_queryset(queryset)
-        serializer = SubscriptionsSerializer(page, many=True,
-                                             context={'request': request})
+        serializer = SubscriptionsSerializer(
+            page, many=True,
+            context={'request': request, 'recipes_limit': recipes_limit}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedCursorPaginator)
+    def feed(self, request):
+        """
+        Возвращает рецепты авторов, на которых подписан текущий
+        пользователь, от новых к старым
+        @param request: объект HttpRequest
+        @return: объект Response со страницей рецептов и ссылками курсора.
+        """
+        page = self.paginate_queryset(
+            readable_recipes(feed_recipes(request.user), request.user))
+        serializer = RecipeReadSerializer(
+            page, many=True, context=self.get_serializer_context())
         return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['POST', 'DELETE'],
@@ -93,10 +193,12 @@ class UserViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
         author = get_object_or_404(User, id=pk)
         self.serializer_class = SubscribeAuthorSerializer
         self.lookup_field = 'author'
+        self.counter_field = 'subscribers_count'
         return self.create_delete_or_scold(Subscribe, author, request)
 
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(RenderedCacheMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
@@ -105,18 +207,38 @@ class IngredientViewSet(mixins.ListModelMixin,
     pagination_class = None
     filter_backends = (filters.SearchFilter, )
     search_fields = ('^name', )
+    cache_version_name = CATALOG
+
+    def list(self, request, *args, **kwargs):
+        """
+        Отдает ингредиенты по началу названия из индекса в памяти,
+        не обращаясь к базе данных. В кэш отрендеренных ответов попадает
+        только полный список: ответы на каждый набранный префикс лишь
+        вытесняли бы из него остальные записи.
+        @param request: объект HttpRequest
+        @return: объект Response со списком ингредиентов.
+        """
+        prefix = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        prefix = prefix.strip()
+        if prefix:
+            return Response(ingredient_index.search(prefix))
+        return self.cached_response(
+            lambda: Response(ingredient_index.search()))
 
 
-class TagViewSet(mixins.ListModelMixin,
+class TagViewSet(RenderedCacheMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     permission_classes = (AllowAny, )
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    cache_version_name = 'tags'
 
 
-class RecipeViewSet(viewsets.ModelViewSet, CreateDeleteMixin):
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet,
+                    CreateDeleteMixin):
     queryset = Recipe.objects.all()
     pagination_class = CustomPaginator
     permission_classes = (IsAuthorOrReadOnly, )
@@ -124,6 +246,26 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateDeleteMixin):
     filterset_class = RecipeFilter
     http_method_names = ['get', 'post', 'patch', 'create', 'delete']
 
+    @property
+    def cursor_ordering(self):
+        """
+        Курсор идет по тому же индексу, что и сортировка выдачи
+        """
+        field = popularity_field(self.request.query_params)
+        if field is None:
+            return ('-pub_date', '-id')
+        return (f'-{field}', '-id')
+
+    @property
+    def version_names(self):
+        """
+        Порядок по популярности меняется при каждом добавлении в избранное
+        или корзину, поэтому входит в ETag
+        """
+        if popularity_field(self.request.query_params) is None:
+            return ('recipes',)
+        return ('recipes', POPULARITY)
+
     def get_serializer_class(self):
         """
         Получает класс сериализатора в зависимости от типа запроса.
@@ -133,11 +275,23 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateDeleteMixin):
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
+    def get_queryset(self):
+        """
+        Для чтения дополняет рецепты флагами текущего пользователя и
+        заранее подгружает автора, теги и ингредиенты одним набором запросов.
+        @return: queryset рецептов
+        """
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve', 'cook'):
+            return queryset
+        return readable_recipes(queryset, self.request.user)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         self.lookup_field = 'recipe'
+        self.counter_field = 'favorites_count'
         return self.create_delete_or_scold(Favorite, recipe, request)
 
     @action(detail=True, methods=['post', 'delete'],
@@ -146,32 +300,67 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateDeleteMixin):
     def shopping_cart(self, request, pk):
         recipe = get_object_or_404(Recipe, id=pk)
         self.lookup_field = 'recipe'
+        self.counter_field = 'in_carts_count'
         return self.create_delete_or_scold(ShoppingCart, recipe, request)
 
     @action(detail=False, methods=['get'],
             permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        user = request.user
-        purchases = ShoppingCart.objects.filter(user=user)
-        file = 'shopping-list.txt'
-        with open(file, 'w') as f:
-            shop_cart = dict()
-            for purchase in purchases:
-                ingredients = IngredientAmount.objects.filter(
-                    recipe=purchase.recipe.id
-                )
-                for r in ingredients:
-                    i = Ingredient.objects.get(pk=r.ingredient.id)
-                    point_name = f'{i.name} ({i.measurement_unit})'
-                    if point_name in shop_cart.keys():
-                        shop_cart[point_name] += r.amount
-                    else:
-                        shop_cart[point_name] = r.amount
-
-            for name, amount in shop_cart.items():
-                f.write(f'* {name} - {amount}\n')
-
-        return FileResponse(open(file, 'rb'), as_attachment=True)
+        """
+        Отдает список покупок текущего пользователя в виде текстового файла
+        @param request: объект HttpRequest
+        @return: объект StreamingHttpResponse со списком покупок.
+        """
+        ingredients = (
+            IngredientAmount.objects
+            .filter(recipe__shopping_recipe__user=request.user)
+            .values('ingredient__name', 'ingredient__measurement_unit')
+            .annotate(total=Sum('amount'))
+            .order_by('ingredient__name', 'ingredient__measurement_unit')
+        )
+        response = StreamingHttpResponse(
+            shopping_list_lines(ingredients),
+            content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{settings.FILE_NAME}"'
+        )
+        return response
+
+    @action(detail=False, methods=['get'],
+            pagination_class=LimitPageNumberPaginator)
+    def cook(self, request):
+        """
+        Подбирает рецепты по имеющимся ингредиентам: сначала те, где
+        набор покрыт полнее, с параметром missing допускает до K
+        недостающих ингредиентов
+        @param request: объект HttpRequest с параметрами ingredients
+                        (повторяется) и missing
+        @return: объект Response со страницей рецептов, числом совпавших
+                 и недостающих ингредиентов и id недостающих.
+        """
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        pantry = set(params.validated_data['ingredients'])
+        page = self.paginate_queryset(pantry_index.search(
+            pantry, params.validated_data['missing']))
+        recipes = self.get_queryset().in_bulk(
+            [match.recipe_id for match in page])
+        pantry_index.discard(match.recipe_id for match in page
+                             if match.recipe_id not in recipes)
+        results = []
+        for match in page:
+            recipe = recipes.get(match.recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_count = match.matched
+            recipe.missing_count = match.missing
+            recipe.missing_ingredients = pantry_index.missing_ingredients(
+                match.recipe_id, pantry)
+            results.append(recipe)
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
 
     def create_delete_or_scold(self, model, recipe, request):
         instance = model.objects.filter(recipe=recipe, user=request.user)
@@ -182,14 +371,22 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateDeleteMixin):
                 status=status.HTTP_400_BAD_REQUEST
             )
         if request.method == 'DELETE':
-            instance.delete()
+            with transaction.atomic():
+                deleted, _ = instance.delete()
+                change_counter(recipe, self.counter_field, -deleted)
+                change_popularity(recipe, -deleted)
+            bump_version(user_state(request.user))
             return Response(status=status.HTTP_204_NO_CONTENT)
         if instance:
             return Response(
                 {'errors': f'Этот рецепт уже был в вашем {name} листе.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.create(user=request.user, recipe=recipe)
+        with transaction.atomic():
+            model.objects.create(user=request.user, recipe=recipe)
+            change_counter(recipe, self.counter_field, 1)
+            change_popularity(recipe, 1)
+        bump_version(user_state(request.user))
         serializer = RecipeSerializer(
             recipe,
             context={
@@ -199,3 +396,14 @@ class RecipeViewSet(viewsets.ModelViewSet, CreateDeleteMixin):
             }
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    """
+    Отдает статистику пула соединений процесса, обработавшего запрос
+    @param request: объект HttpRequest
+    @return: объект Response с pid процесса и счетчиками пулов.
+    """
+    return Response({'pid': os.getpid(), 'pools': pool_stats()})
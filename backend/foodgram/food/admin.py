@@ -28,7 +28,7 @@ class RecipeAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
 
     def count_add_favorited(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
 
     count_add_favorited.short_description = 'Сколько раз добавлен в избранное'
 
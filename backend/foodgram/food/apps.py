@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class FoodConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'food'
+
+    def ready(self):
+        import food.signals  # noqa: F401
+        from food.search import ensure_installed_after_migrate
+
+        post_migrate.connect(ensure_installed_after_migrate, sender=self)
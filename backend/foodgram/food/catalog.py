@@ -0,0 +1,173 @@
+import heapq
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict, namedtuple
+
+from food.versions import bump_version, get_version
+from foodgram.db_router import use_primary
+from unidecode import unidecode
+
+CATALOG = 'ingredients'
+
+
+def get_catalog_version():
+    """
+    Возвращает текущую версию каталога ингредиентов
+    @return: строка версии
+    """
+    return get_version(CATALOG)
+
+
+def bump_catalog_version():
+    """Помечает каталог ингредиентов как измененный."""
+    bump_version(CATALOG)
+
+
+FUZZY_MIN_LENGTH = 3
+FUZZY_LIMIT = 10
+FUZZY_THRESHOLD = 0.3
+QUERY_MAX_LENGTH = 64
+
+Snapshot = namedtuple('Snapshot', (
+    'version', 'items', 'keys', 'translit_keys', 'translit_order',
+    'trigrams', 'sizes'))
+
+
+def translit_key(text):
+    """
+    Нормализованный ключ для поиска без учета алфавита: транслитерация
+    unidecode и приведение регистра
+    @param text: строка
+    @return: ключ латиницей
+    """
+    return unidecode(text).casefold()
+
+
+def trigrams(key):
+    """
+    Триграммы слов ключа, как в pg_trgm: слово дополняется двумя
+    пробелами слева и одним справа
+    @param key: нормализованная строка
+    @return: множество триграмм
+    """
+    result = set()
+    for word in re.findall(r'\w+', key):
+        padded = f'  {word} '
+        result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+def prefix_range(keys, prefix):
+    start = bisect_left(keys, prefix)
+    return start, bisect_left(keys, prefix + '\U0010ffff', start)
+
+
+class IngredientIndex:
+    """
+    Неизменяемый индекс каталога ингредиентов в памяти процесса.
+    Строится лениво при первом запросе и перестраивается, когда меняется
+    версия каталога.
+
+    Поиск ранжирует: сначала совпадения по началу названия, затем по
+    началу транслитерированного названия. Если их меньше FUZZY_LIMIT,
+    выдача дополняется до FUZZY_LIMIT названиями, похожими по триграммам
+    (опечатки, другой вариант транслитерации).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot_data = None
+
+    def _build(self, version):
+        from food.models import Ingredient
+
+        with use_primary():
+            rows = sorted(
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'),
+                key=lambda row: (row[1].casefold(), row[0])
+            )
+        items = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in rows
+        )
+        translit = [translit_key(name) for _, name, _ in rows]
+        translit_order = tuple(sorted(range(len(rows)),
+                                      key=lambda index: translit[index]))
+        postings = defaultdict(list)
+        sizes = []
+        for index, key in enumerate(translit):
+            grams = trigrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings[gram].append(index)
+        self._snapshot_data = Snapshot(
+            version=version,
+            items=items,
+            keys=tuple(name.casefold() for _, name, _ in rows),
+            translit_keys=tuple(translit[index] for index in translit_order),
+            translit_order=translit_order,
+            trigrams={gram: tuple(indexes)
+                      for gram, indexes in postings.items()},
+            sizes=tuple(sizes),
+        )
+
+    def _snapshot(self):
+        version = get_catalog_version()
+        data = self._snapshot_data
+        if data is not None and data.version == version:
+            return data
+        with self._lock:
+            data = self._snapshot_data
+            if data is None or data.version != version:
+                self._build(version)
+            return self._snapshot_data
+
+    def similar(self, data, key, exclude, limit):
+        """
+        Ищет названия, похожие на ключ по триграммам
+        @param data: снимок индекса
+        @param key: транслитерированный запрос
+        @param exclude: позиции, которые уже есть в выдаче
+        @param limit: сколько позиций вернуть
+        @return: позиции, отсортированные по убыванию сходства
+        """
+        grams = trigrams(key)
+        if not grams:
+            return []
+        common = Counter()
+        for gram in grams:
+            common.update(data.trigrams.get(gram, ()))
+        scored = []
+        for index, shared in common.items():
+            score = shared / (len(grams) + data.sizes[index] - shared)
+            if score >= FUZZY_THRESHOLD and index not in exclude:
+                scored.append((-score, data.keys[index], index))
+        return [index for _, _, index in heapq.nsmallest(limit, scored)]
+
+    def search(self, prefix=''):
+        """
+        Ищет ингредиенты по началу названия, транслитерации и сходству
+        @param prefix: строка запроса без учета регистра
+        @return: список ингредиентов в виде словарей
+        """
+        data = self._snapshot()
+        query = prefix[:QUERY_MAX_LENGTH].casefold()
+        if not query:
+            return list(data.items)
+        start, end = prefix_range(data.keys, query)
+        found = list(range(start, end))
+        seen = set(found)
+        key = translit_key(query)
+        start, end = prefix_range(data.translit_keys, key)
+        for index in data.translit_order[start:end]:
+            if index not in seen:
+                found.append(index)
+                seen.add(index)
+        if len(found) < FUZZY_LIMIT and len(query) >= FUZZY_MIN_LENGTH:
+            found += self.similar(data, key, seen, FUZZY_LIMIT - len(found))
+        return [data.items[index] for index in found]
+
+
+ingredient_index = IngredientIndex()
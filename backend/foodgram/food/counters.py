@@ -0,0 +1,64 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+
+def change_counter(obj, field, delta):
+    """
+    Атомарно изменяет денормализованный счетчик объекта через F()
+    @param obj: экземпляр модели со счетчиком
+    @param field: имя поля-счетчика
+    @param delta: на сколько изменить счетчик
+    """
+    if not field or not delta:
+        return
+    type(obj).objects.filter(pk=obj.pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))}
+    )
+
+
+def counter_subquery(model, fk_field):
+    """
+    Подзапрос, считающий строки model, ссылающиеся на внешний объект
+    @param model: модель связи, например Favorite
+    @param fk_field: поле связи с объектом счетчика
+    @return: выражение с количеством строк
+    """
+    counts = (
+        model.objects
+        .filter(**{fk_field: OuterRef('pk')})
+        .order_by()
+        .values(fk_field)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def counters():
+    """
+    Описание всех денормализованных счетчиков
+    @return: список кортежей (модель, поле, модель связи, поле связи)
+    """
+    from food.models import Favorite, Recipe, ShoppingCart
+    from users.models import Subscribe, User
+
+    return [
+        (Recipe, 'favorites_count', Favorite, 'recipe'),
+        (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'subscribers_count', Subscribe, 'author'),
+    ]
+
+
+def recount(model, field, related_model, fk_field):
+    """
+    Пересчитывает счетчик там, где он разошелся с данными
+    @return: количество исправленных строк
+    """
+    actual = counter_subquery(related_model, fk_field)
+    return (
+        model.objects
+        .annotate(actual=actual)
+        .filter(~Q(**{field: F('actual')}))
+        .update(**{field: actual})
+    )
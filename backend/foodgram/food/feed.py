@@ -0,0 +1,123 @@
+"""
+Лента рецептов авторов, на которых подписан пользователь.
+
+Пока подписок меньше FEED_MATERIALIZE_THRESHOLD, лента собирается
+запросом по подпискам (fan-in). Когда подписок становится больше,
+лента материализуется в FeedEntry: новые рецепты раскладываются
+подписчикам при создании (fan-out), подписка дописывает рецепты автора,
+отписка их убирает. Материализованная лента сбрасывается, когда подписок
+становится меньше половины порога, чтобы пользователь на границе не
+переключался туда и обратно.
+"""
+from django.conf import settings
+from django.db.models import F
+from food.models import FeedEntry, Recipe
+from users.models import Subscribe, User
+
+BATCH_SIZE = 1000
+
+
+def feed_recipes(user):
+    """
+    Рецепты ленты пользователя с аннотацией feed_date для курсора
+    @param user: экземпляр модели User
+    @return: queryset рецептов без сортировки
+    """
+    if user.feed_materialized:
+        return Recipe.objects.filter(feed_entries__user=user).annotate(
+            feed_date=F('feed_entries__pub_date'))
+    return Recipe.objects.filter(
+        author__in=Subscribe.objects.filter(user=user).values('author'),
+    ).annotate(feed_date=F('pub_date'))
+
+
+def add_entries(user_ids, recipes):
+    """
+    Добавляет рецепты в ленты пользователей, пропуская уже добавленные
+    @param user_ids: id пользователей
+    @param recipes: кортежи (id рецепта, id автора, время публикации)
+    """
+    batch = []
+    for recipe_id, author_id, pub_date in recipes:
+        batch += [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                            author_id=author_id, pub_date=pub_date)
+                  for user_id in user_ids]
+        if len(batch) >= BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(user_id, authors):
+    """
+    Дописывает в ленту пользователя все рецепты авторов
+    @param user_id: id пользователя
+    @param authors: id авторов или queryset с ними
+    """
+    add_entries([user_id], Recipe.objects.filter(
+        author__in=authors,
+    ).values_list('id', 'author_id', 'pub_date').iterator(BATCH_SIZE))
+
+
+def materialize(user_id):
+    """
+    Заполняет ленту пользователя по всем подпискам
+    @param user_id: id пользователя
+    """
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    backfill(user_id, Subscribe.objects.filter(
+        user_id=user_id).values('author'))
+    User.objects.filter(pk=user_id).update(feed_materialized=True)
+
+
+def dematerialize(user_id):
+    """
+    Удаляет ленту пользователя, дальше она собирается запросом
+    @param user_id: id пользователя
+    """
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    User.objects.filter(pk=user_id).update(feed_materialized=False)
+
+
+def subscribed(user, author_id):
+    """
+    Дописывает рецепты автора в материализованную ленту или материализует
+    ленту, если подписок стало не меньше порога
+    @param user: экземпляр модели User - подписчик
+    @param author_id: id автора
+    """
+    if user.feed_materialized:
+        backfill(user.pk, [author_id])
+    elif (Subscribe.objects.filter(user=user).count()
+          >= settings.FEED_MATERIALIZE_THRESHOLD):
+        materialize(user.pk)
+        user.feed_materialized = True
+
+
+def unsubscribed(user, author_id):
+    """
+    Убирает рецепты автора из материализованной ленты или сбрасывает
+    ленту, если подписок стало меньше половины порога
+    @param user: экземпляр модели User - подписчик
+    @param author_id: id автора
+    """
+    if not user.feed_materialized:
+        return
+    if (Subscribe.objects.filter(user=user).count()
+            < settings.FEED_MATERIALIZE_THRESHOLD // 2):
+        dematerialize(user.pk)
+        user.feed_materialized = False
+    else:
+        FeedEntry.objects.filter(user=user, author_id=author_id).delete()
+
+
+def fan_out(recipe):
+    """
+    Раскладывает новый рецепт по материализованным лентам подписчиков
+    @param recipe: экземпляр модели Recipe
+    """
+    add_entries(
+        list(Subscribe.objects.filter(
+            author_id=recipe.author_id, user__feed_materialized=True,
+        ).values_list('user_id', flat=True)),
+        [(recipe.pk, recipe.author_id, recipe.pub_date)])
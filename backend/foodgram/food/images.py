@@ -0,0 +1,193 @@
+import hashlib
+import io
+import logging
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from food.models import Recipe
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 600,
+    'full': 1600,
+}
+
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+logger = logging.getLogger('foodgram.images')
+
+
+def to_rgb(image):
+    """
+    Приводит изображение к RGB, накладывая прозрачные области на белый фон
+    @param image: объект PIL.Image
+    @return: объект PIL.Image в режиме RGB
+    """
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, image_format):
+    """
+    Кодирует изображение без метаданных
+    @param image: объект PIL.Image в режиме RGB
+    @param image_format: формат Pillow, например 'JPEG'
+    @return: байты закодированного изображения
+    """
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True,
+                   progressive=True)
+    else:
+        image.save(buffer, image_format, quality=WEBP_QUALITY)
+    return buffer.getvalue()
+
+
+def save_content_addressed(variant, content, ext):
+    """
+    Сохраняет файл под именем, полученным из хеша его содержимого.
+    Одинаковые файлы сохраняются один раз.
+    @param variant: имя варианта, используется как каталог
+    @param content: байты файла
+    @param ext: расширение файла
+    @return: имя файла в хранилище
+    """
+    digest = hashlib.sha256(content).hexdigest()[:32]
+    name = f'recipes/{variant}/{digest}.{ext}'
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, ContentFile(content))
+
+
+def make_variants(image):
+    """
+    Создает все варианты картинки во всех форматах. thumbnail() не
+    увеличивает картинку, поэтому у небольшой картинки несколько вариантов
+    совпадают по размеру: такой вариант не кодируется заново и ссылается
+    на файлы предыдущего.
+    @param image: объект PIL.Image в режиме RGB
+    @return: словарь {вариант: {'width': ширина, формат: имя файла}}
+    """
+    variants = {}
+    previous = None
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        if previous is not None and resized.size == previous[0]:
+            variants[variant] = variants[previous[1]]
+            continue
+        previous = (resized.size, variant)
+        variants[variant] = {'width': resized.width}
+        for key, (image_format, ext) in FORMATS.items():
+            variants[variant][key] = save_content_addressed(
+                variant, encode(resized, image_format), ext)
+    return variants
+
+
+def has_current_variants(recipe):
+    """
+    Проверяет, что у рецепта есть все варианты картинки во всех форматах
+    @param recipe: экземпляр модели Recipe
+    @return: True, если варианты актуальны
+    """
+    variants = recipe.image_variants or {}
+    return all(
+        isinstance(variants.get(variant), dict)
+        and all(key in variants[variant] for key in FORMATS)
+        for variant in VARIANTS
+    )
+
+
+def load_image(name):
+    """
+    Открывает и проверяет загруженный файл
+    @param name: имя файла в хранилище
+    @return: объект PIL.Image с примененной EXIF-ориентацией
+    """
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image.load()
+    return to_rgb(ImageOps.exif_transpose(image))
+
+
+def mark_failed(recipe, raw_name):
+    """
+    Помечает картинку рецепта как необработанную. updated_at меняется,
+    чтобы клиенты не получали по старому ETag ответ со статусом pending.
+    @param recipe: экземпляр модели Recipe
+    @param raw_name: имя исходного файла в хранилище
+    """
+    Recipe.objects.filter(pk=recipe.pk, image=raw_name).update(
+        image_status=Recipe.IMAGE_FAILED, updated_at=timezone.now())
+
+
+def process_recipe_image(recipe):
+    """
+    Создает варианты картинки рецепта без метаданных и заменяет исходный
+    файл полноразмерным JPEG-вариантом. Исходный файл удаляется.
+    @param recipe: экземпляр модели Recipe
+    @return: True, если картинка обработана, иначе False
+    """
+    raw_name = recipe.image.name
+    try:
+        image = load_image(raw_name)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        mark_failed(recipe, raw_name)
+        return False
+
+    variants = make_variants(image)
+    full_name = variants['full']['jpeg']
+    updated = Recipe.objects.filter(pk=recipe.pk, image=raw_name).update(
+        image=full_name, image_status=Recipe.IMAGE_READY,
+        image_variants=variants, updated_at=timezone.now())
+    new_names = {name for variant in variants.values()
+                 for key, name in variant.items() if key in FORMATS}
+    if (updated and raw_name not in new_names
+            and not Recipe.objects.filter(image=raw_name).exists()):
+        default_storage.delete(raw_name)
+    return bool(updated)
+
+
+def process_pending_images(limit):
+    """
+    Обрабатывает картинки рецептов, ожидающие обработки
+    @param limit: максимальное количество рецептов за вызов
+    @return: количество обработанных рецептов
+    """
+    processed = 0
+    for _ in range(limit):
+        with transaction.atomic():
+            recipe = (
+                Recipe.objects
+                .select_for_update(skip_locked=True)
+                .filter(image_status=Recipe.IMAGE_PENDING)
+                .exclude(image='')
+                .order_by('pk')
+                .first()
+            )
+            if recipe is None:
+                break
+            try:
+                with transaction.atomic():
+                    process_recipe_image(recipe)
+            except Exception:
+                # Иначе та же запись в статусе pending роняла бы каждый
+                # следующий запуск обработчика.
+                logger.exception('Не удалось обработать картинку рецепта %s',
+                                 recipe.pk)
+                mark_failed(recipe, recipe.image.name)
+        processed += 1
+    return processed
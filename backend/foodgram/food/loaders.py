@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from itertools import islice
+
+from django.db import connection, transaction
+from food.catalog import bump_catalog_version
+from food.models import Ingredient
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(path):
+    """
+    Построчно читает ингредиенты из CSV-файла вида «название,единица»
+    @param path: путь к файлу
+    @return: генератор пар (название, единица измерения)
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as csvfile:
+        for row in csv.reader(csvfile, delimiter=','):
+            if len(row) >= 2:
+                yield row[0].strip(), row[1].strip()
+
+
+def read_json(path):
+    """
+    Потоково читает ингредиенты из JSON-массива объектов с полями
+    name и measurement_unit, не загружая файл в память целиком
+    @param path: путь к файлу
+    @return: генератор пар (название, единица измерения)
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as jsonfile:
+        buffer = ''
+        eof = False
+        while True:
+            buffer = buffer.lstrip(' \t\r\n[,')
+            if buffer.startswith(']') or (eof and not buffer):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                chunk = jsonfile.read(READ_CHUNK_SIZE)
+                eof = not chunk
+                buffer += chunk
+                continue
+            buffer = buffer[end:]
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, batch_size):
+    """
+    Разбивает поток строк на списки длиной не больше batch_size
+    @param rows: итерируемый объект со строками
+    @param batch_size: размер пачки
+    @return: генератор списков строк
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def bulk_load(rows, batch_size):
+    """
+    Загружает ингредиенты пачками через bulk_create, пропуская уже
+    существующие пары «название, единица»
+    @param rows: итерируемый объект с парами (название, единица)
+    @param batch_size: количество строк в одном INSERT
+    @return: количество прочитанных строк
+    """
+    total = 0
+    for batch in batches(rows, batch_size):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch],
+            ignore_conflicts=True
+        )
+        total += len(batch)
+    return total
+
+
+def copy_load(rows, batch_size):
+    """
+    Загружает ингредиенты через COPY во временную таблицу и переносит их
+    в каталог одним INSERT ... ON CONFLICT DO NOTHING. Только PostgreSQL.
+    @param rows: итерируемый объект с парами (название, единица)
+    @param batch_size: количество строк в одном COPY
+    @return: количество прочитанных строк
+    """
+    table = Ingredient._meta.db_table
+    total = 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE ingredient_import '
+            '(name varchar(200), measurement_unit varchar(20)) '
+            'ON COMMIT DROP'
+        )
+        for batch in batches(rows, batch_size):
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                buffer
+            )
+            total += len(batch)
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit) '
+            'SELECT DISTINCT name, measurement_unit FROM ingredient_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+    return total
+
+
+def load_ingredients(rows, batch_size, use_copy=False):
+    """
+    Загружает ингредиенты в одной транзакции и сбрасывает индекс каталога
+    @param rows: итерируемый объект с парами (название, единица)
+    @param batch_size: размер пачки
+    @param use_copy: использовать COPY (только PostgreSQL)
+    @return: кортеж (прочитано, добавлено)
+    """
+    with transaction.atomic():
+        before = Ingredient.objects.count()
+        loader = copy_load if use_copy else bulk_load
+        total = loader(rows, batch_size)
+        inserted = Ingredient.objects.count() - before
+    if inserted:
+        bump_catalog_version()
+    return total, inserted
@@ -0,0 +1,46 @@
+import os.path
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from food.loaders import READERS, load_ingredients
+
+
+class LoadIngredientsCommand(BaseCommand):
+    """Общая часть команд загрузки каталога ингредиентов."""
+    default_format = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            help='Путь к файлу (по умолчанию data/ingredients.<формат>)')
+        parser.add_argument(
+            '--format', choices=sorted(READERS), default=self.default_format,
+            help='Формат файла')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной пачке')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Загружать через COPY (только PostgreSQL)')
+
+    def handle(self, *args, **options):
+        file_format = options['format']
+        path = options['path'] or os.path.join(
+            settings.BASE_DIR, 'data', f'ingredients.{file_format}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только в PostgreSQL.')
+        if not os.path.isfile(path):
+            raise CommandError(f'Файл {path} не найден.')
+
+        started = time.perf_counter()
+        total, inserted = load_ingredients(
+            READERS[file_format](path), options['batch_size'],
+            use_copy=options['copy'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {total - inserted}, '
+            f'время: {elapsed:.2f} с'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from food.images import has_current_variants, process_recipe_image
+from food.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Создает недостающие варианты картинок для уже загруженных '
+            'рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать варианты у всех рецептов')
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        for recipe in Recipe.objects.exclude(image='').order_by('pk').only(
+                'pk', 'image', 'image_variants').iterator():
+            if not options['force'] and has_current_variants(recipe):
+                continue
+            if process_recipe_image(recipe):
+                processed += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано: {processed}, с ошибкой: {failed}'))
@@ -0,0 +1,53 @@
+import json
+
+from api.loadtest import READ_SCENARIOS, LoadTest
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность читающих эндпоинтов под '
+            'WSGI и ASGI при разном числе одновременных клиентов')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://localhost:8000/',
+                            help='Сервер gunicorn с foodgram.wsgi')
+        parser.add_argument('--asgi-url', default='http://localhost:8001/',
+                            help='Сервер gunicorn/uvicorn с foodgram.asgi')
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[1, 8, 32, 64])
+        parser.add_argument('--duration', type=float, default=15,
+                            help='Длительность каждого прогона в секундах')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--email', default='user{}@example.com')
+        parser.add_argument('--password', default='foodgram-seed')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        emails = [options['email'].format(number)
+                  for number in range(options['users'])]
+        results = []
+        for concurrency in options['concurrency']:
+            for server in ('wsgi', 'asgi'):
+                test = LoadTest(options[f'{server}_url'], mix=READ_SCENARIOS)
+                try:
+                    test.login(emails, options['password'])
+                    test.discover()
+                except RuntimeError as error:
+                    raise CommandError(f'{server}: {error}')
+                elapsed = test.run(concurrency, options['duration'],
+                                   10 ** 9)
+                result = {'server': server, 'concurrency': concurrency,
+                          **test.summary(elapsed)}
+                results.append(result)
+                self.stdout.write(self.format_row(result))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def format_row(self, result):
+        total = result['total']
+        return (f'{result["server"]:<5} клиентов {result["concurrency"]:>3}: '
+                f'{total["rps"]:>8.1f} rps, p50 {total["p50_ms"]:.1f} мс, '
+                f'p95 {total["p95_ms"]:.1f} мс, p99 {total["p99_ms"]:.1f} мс, '
+                f'ошибок {total["errors"]}')
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from food.catalog import ingredient_index, translit_key
+from food.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск ингредиентов по началу названия через индекс '
+            'в памяти и через ORM, замеряет поиск с опечатками и '
+            'транслитерацией')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз повторить каждый запрос')
+
+    def measure(self, search, prefixes, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for prefix in prefixes:
+                search(prefix)
+        return (time.perf_counter() - started) / (repeat * len(prefixes))
+
+    def typo_queries(self, names, count=200):
+        """
+        Названия с одной замененной буквой и их транслитерация
+        """
+        rng = random.Random(0)
+        sample = [name for name in names if len(name) > 4]
+        queries = []
+        for name in rng.sample(sample, min(count, len(sample))):
+            position = rng.randrange(1, len(name) - 1)
+            typo = name[:position] + rng.choice('аеиоу') + name[position + 1:]
+            queries += [typo, translit_key(name)]
+        return queries
+
+    def handle(self, *args, **options):
+        names = Ingredient.objects.values_list('name', flat=True)
+        prefixes = sorted({name[:length].lower() for name in names
+                           for length in (1, 2, 3) if name[:length]})
+        if not prefixes:
+            self.stdout.write(self.style.WARNING('Каталог ингредиентов пуст.'))
+            return
+        ingredient_index.search()
+
+        def orm_search(prefix):
+            return list(Ingredient.objects.filter(
+                name__istartswith=prefix
+            ).values('id', 'name', 'measurement_unit'))
+
+        index_time = self.measure(ingredient_index.search, prefixes,
+                                  options['repeat'])
+        orm_time = self.measure(orm_search, prefixes, options['repeat'])
+        self.stdout.write(f'Префиксов: {len(prefixes)}')
+        self.stdout.write(f'Индекс: {index_time * 1e6:.1f} мкс на запрос')
+        self.stdout.write(f'ORM: {orm_time * 1e6:.1f} мкс на запрос')
+        self.stdout.write(self.style.SUCCESS(
+            f'Ускорение: {orm_time / index_time:.1f}x'))
+        queries = self.typo_queries(list(names))
+        found = sum(bool(ingredient_index.search(query)) for query in queries)
+        fuzzy_time = self.measure(ingredient_index.search, queries,
+                                  options['repeat'])
+        self.stdout.write(
+            f'Опечатки и транслитерация: {fuzzy_time * 1e6:.1f} мкс на '
+            f'запрос, найдено {found} из {len(queries)}')
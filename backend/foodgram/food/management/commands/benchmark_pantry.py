@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, Q
+from food.models import Ingredient, IngredientAmount, Recipe
+from food.pantry import pantry_index
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает подбор рецептов по имеющимся ингредиентам через '
+            'инвертированный индекс в памяти и через агрегат ORM, '
+            'проверяет совпадение результатов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pantries', type=int, default=50,
+                            help='Сколько наборов ингредиентов проверить')
+        parser.add_argument('--size', type=int, default=10,
+                            help='Сколько ингредиентов в наборе')
+        parser.add_argument('--missing', type=int, nargs='+',
+                            default=[0, 1, 2],
+                            help='Сколько ингредиентов может не хватать')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def pantries(self, count, size, seed):
+        """
+        Наборы из ингредиентов случайного рецепта и случайных добавок,
+        чтобы часть рецептов покрывалась полностью
+        """
+        rng = random.Random(seed)
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        pantries = []
+        for _ in range(count):
+            pantry = set(IngredientAmount.objects.filter(
+                recipe_id=rng.choice(recipe_ids),
+            ).values_list('ingredient_id', flat=True)[:size])
+            pantry.update(rng.sample(
+                ingredient_ids,
+                min(max(size - len(pantry), 0), len(ingredient_ids))))
+            pantries.append(pantry)
+        return pantries
+
+    def orm_search(self, pantry, missing):
+        return list(Recipe.objects.annotate(
+            total=Count('recipes'),
+            matched=Count('recipes',
+                          filter=Q(recipes__ingredient_id__in=pantry)),
+        ).filter(
+            matched__gt=0, total__lte=F('matched') + missing,
+        ).values_list('id', 'matched', 'total'))
+
+    def measure(self, search, pantries, missing):
+        started = time.perf_counter()
+        results = [search(pantry, missing) for pantry in pantries]
+        return (time.perf_counter() - started) / len(pantries), results
+
+    def handle(self, *args, **options):
+        if not Recipe.objects.exists():
+            self.stdout.write(self.style.WARNING('Рецептов нет.'))
+            return
+        started = time.perf_counter()
+        pantry_index.refresh()
+        self.stdout.write(
+            f'Построение индекса: {time.perf_counter() - started:.2f} с')
+        pantries = self.pantries(options['pantries'], options['size'],
+                                 options['seed'])
+        for missing in options['missing']:
+            index_time, index_results = self.measure(
+                pantry_index.search, pantries, missing)
+            orm_time, orm_results = self.measure(
+                self.orm_search, pantries, missing)
+            mismatches = sum(
+                {match.recipe_id for match in index_result}
+                != {recipe_id for recipe_id, _, _ in orm_result}
+                for index_result, orm_result in zip(index_results,
+                                                    orm_results))
+            found = sum(map(len, index_results)) / len(pantries)
+            self.stdout.write(
+                f'missing={missing}: найдено {found:.1f} рецептов в среднем, '
+                f'индекс {index_time * 1e3:.2f} мс, '
+                f'ORM {orm_time * 1e3:.2f} мс, '
+                f'ускорение {orm_time / index_time:.1f}x')
+            if mismatches:
+                self.stdout.write(self.style.ERROR(
+                    f'Результаты расходятся для {mismatches} наборов'))
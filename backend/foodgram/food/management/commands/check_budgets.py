@@ -0,0 +1,114 @@
+import statistics
+import time
+
+from api.budgets import BUDGETS
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from food.models import Recipe
+from food.seeding import heaviest_user, seeded_test_database
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+SIZES = (
+    ('small', 100, 1000),
+    ('large', 1000, 10000),
+)
+
+
+def p95(values):
+    return statistics.quantiles(values, n=20)[-1] if len(values) > 1 else (
+        values[0])
+
+
+def result_count(response):
+    """
+    @return: число объектов в ответе со списком или с пагинацией
+    """
+    data = response.json()
+    if isinstance(data, dict):
+        data = data.get('results', ())
+    return len(data)
+
+
+class Command(BaseCommand):
+    help = ('Проверяет число SQL-запросов и время ответа эндпоинтов API '
+            'по таблице api/budgets.py на двух размерах данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз выполнить каждый запрос')
+        parser.add_argument('--check-latency', action='store_true',
+                            help='Проверять и бюджеты времени ответа, а не '
+                                 'только число запросов')
+
+    def handle(self, *args, **options):
+        results = {}
+        for size, users, recipes in SIZES:
+            with seeded_test_database(users, recipes):
+                results[size] = self.measure(options['repeat'])
+        failures = self.report(results, options['check_latency'])
+        if failures:
+            raise CommandError('\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены.'))
+
+    def path_values(self, user):
+        recipe = Recipe.objects.exclude(favorite_recipe__user=user).exclude(
+            shopping_recipe__user=user).exclude(author=user).first()
+        author = User.objects.exclude(pk=user.pk).exclude(
+            subscribing__user=user).first()
+        return {'recipe': recipe.pk, 'author': author.pk}
+
+    def measure(self, repeat):
+        from api.cache import local_cache
+
+        local_cache.clear()
+        user = heaviest_user()
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        values = self.path_values(user)
+        stats = {budget.name: {'queries': 0, 'times': []}
+                 for budget in BUDGETS}
+        for _ in range(repeat):
+            for budget in BUDGETS:
+                path = budget.path.format(**values)
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as context:
+                    response = getattr(client, budget.method)(path)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{budget.name}: статус {response.status_code}')
+                if budget.non_empty and not result_count(response):
+                    raise CommandError(f'{budget.name}: пустой ответ')
+                stat = stats[budget.name]
+                stat['queries'] = max(stat['queries'],
+                                      len(context.captured_queries))
+                stat['times'].append(elapsed)
+        return stats
+
+    def report(self, results, check_latency):
+        failures = []
+        for budget in BUDGETS:
+            small = results['small'][budget.name]
+            large = results['large'][budget.name]
+            latency = p95(large['times'])
+            self.stdout.write(
+                f'{budget.name}: запросов {small["queries"]}/'
+                f'{large["queries"]} (бюджет {budget.queries}), '
+                f'p95 {latency:.1f} мс (бюджет {budget.p95})')
+            if large['queries'] > budget.queries:
+                failures.append(f'{budget.name}: {large["queries"]} '
+                                f'запросов > {budget.queries}')
+            if large['queries'] > small['queries']:
+                failures.append(
+                    f'{budget.name}: число запросов растет с объемом данных '
+                    f'({small["queries"]} -> {large["queries"]})')
+            if check_latency and latency > budget.p95:
+                failures.append(f'{budget.name}: p95 {latency:.1f} мс > '
+                                f'{budget.p95} мс')
+        return failures
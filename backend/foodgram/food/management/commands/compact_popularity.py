@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from food.popularity import compact, rebuild
+
+
+class Command(BaseCommand):
+    help = ('Уплотняет часовые корзины популярности и пересчитывает окна '
+            'дня и недели. Запускать периодически, например раз в 15 минут')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Заполнить популярность заново из счетчиков '
+                                 'избранного и корзин')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.stdout.write(f'Учтено рецептов: {rebuild()}')
+        result = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Свернуто корзин: {result["archived"]}, изменено окон дня: '
+            f'{result["day"]}, недели: {result["week"]}.'))
@@ -0,0 +1,70 @@
+import json
+import platform
+from datetime import datetime, timezone
+
+from api.loadtest import LoadTest
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест запущенного сервера смесью типичных запросов: '
+            'пропускная способность и p50/p95/p99 по эндпоинтам')
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000/',
+                            help='Адрес сервера')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Длительность прогона в секундах')
+        parser.add_argument('--scenarios', type=int, default=10 ** 9,
+                            help='Ограничение по числу сценариев')
+        parser.add_argument('--users', type=int, default=20,
+                            help='Сколько пользователей залогинить')
+        parser.add_argument('--email', default='user{}@example.com',
+                            help='Шаблон адреса пользователей seed_foodgram')
+        parser.add_argument('--password', default='foodgram-seed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--label', default='',
+                            help='Метка прогона, например коммит или '
+                                 'конфигурация gunicorn')
+        parser.add_argument('--output', help='Файл для результатов в JSON')
+
+    def handle(self, *args, **options):
+        test = LoadTest(options['url'])
+        try:
+            test.login([options['email'].format(number)
+                        for number in range(options['users'])],
+                       options['password'])
+            test.discover()
+        except RuntimeError as error:
+            raise CommandError(error)
+        elapsed = test.run(options['concurrency'], options['duration'],
+                           options['scenarios'], options['seed'])
+        result = {
+            'label': options['label'],
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'python': platform.python_version(),
+            **test.summary(elapsed),
+        }
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+
+    def report(self, result):
+        self.stdout.write(f'{"эндпоинт":<28}{"запросов":>9}{"ошибок":>8}'
+                          f'{"rps":>9}{"p50":>9}{"p95":>9}{"p99":>9}')
+        for name, stat in result['endpoints'].items():
+            self.stdout.write(
+                f'{name:<28}{stat["requests"]:>9}{stat["errors"]:>8}'
+                f'{stat["rps"]:>9.1f}{stat["p50_ms"]:>9.1f}'
+                f'{stat["p95_ms"]:>9.1f}{stat["p99_ms"]:>9.1f}')
+        total = result['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'Всего {total["requests"]} запросов за {result["elapsed_s"]} с, '
+            f'{total["rps"]} rps, ошибок {total["errors"]}, '
+            f'p50/p95/p99 {total["p50_ms"]}/{total["p95_ms"]}/'
+            f'{total["p99_ms"]} мс'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from food.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = ('Обрабатывает загруженные картинки рецептов: удаляет метаданные '
+            'и создает уменьшенные варианты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Работать постоянно, опрашивая базу')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Пауза между опросами в секундах')
+        parser.add_argument('--batch-size', type=int, default=20,
+                            help='Сколько картинок обработать за проход')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_images(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано картинок: {processed}')
+            if not options['loop']:
+                break
+            if processed < options['batch_size']:
+                time.sleep(options['interval'])
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from food.feed import dematerialize, materialize
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Материализует ленты пользователей, у которых подписок не меньше '
+            'FEED_MATERIALIZE_THRESHOLD, и сбрасывает остальные')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='*',
+                            help='id пользователей, по умолчанию все')
+
+    def handle(self, *args, **options):
+        users = User.objects.annotate(subscriptions=Count('subscriber'))
+        if options['user']:
+            users = users.filter(pk__in=options['user'])
+        threshold = settings.FEED_MATERIALIZE_THRESHOLD
+        built = dropped = 0
+        for user_id, subscriptions, materialized in users.values_list(
+                'id', 'subscriptions', 'feed_materialized').iterator():
+            with transaction.atomic():
+                if subscriptions >= threshold:
+                    materialize(user_id)
+                    built += 1
+                elif materialized:
+                    dematerialize(user_id)
+                    dropped += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Материализовано лент: {built}, сброшено: {dropped}.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from food.counters import counters, recount
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики избранного, корзин, рецептов и '
+            'подписчиков')
+
+    def handle(self, *args, **options):
+        for model, field, related_model, fk_field in counters():
+            with transaction.atomic():
+                fixed = recount(model, field, related_model, fk_field)
+            self.stdout.write(
+                f'{model.__name__}.{field}: исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны.'))
@@ -0,0 +1,50 @@
+import os.path
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from food.seeding import seed_dataset
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, корзинами и подписками для нагрузочных проверок')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Начальное значение генератора')
+        parser.add_argument('--favorites', type=float, default=10,
+                            help='Среднее число избранных на пользователя')
+        parser.add_argument('--carts', type=float, default=3,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument('--subscriptions', type=float, default=5,
+                            help='Среднее число подписок на пользователя')
+        parser.add_argument('--alpha', type=float, default=1.1,
+                            help='Показатель степенного закона популярности')
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить публикации')
+        parser.add_argument('--password', default='foodgram-seed',
+                            help='Пароль всех созданных пользователей')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--path', default=os.path.join(
+            settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='CSV-каталог ингредиентов')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно минимум 2 пользователя и 1 рецепт.')
+        started = time.perf_counter()
+        with transaction.atomic():
+            seed_dataset(
+                options['path'], options['users'], options['recipes'],
+                options['seed'], favorites=options['favorites'],
+                carts=options['carts'],
+                subscriptions=options['subscriptions'],
+                alpha=options['alpha'], days=options['days'],
+                password=options['password'],
+                batch_size=options['batch_size'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
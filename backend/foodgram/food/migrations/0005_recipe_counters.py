@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-17 05:55
+
+from django.db import migrations, models
+
+from food.counters import counter_subquery
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('food', 'Recipe')
+    Favorite = apps.get_model('food', 'Favorite')
+    ShoppingCart = apps.get_model('food', 'ShoppingCart')
+    User = apps.get_model('users', 'User')
+    Subscribe = apps.get_model('users', 'Subscribe')
+    Recipe.objects.update(
+        favorites_count=counter_subquery(Favorite, 'recipe'),
+        in_carts_count=counter_subquery(ShoppingCart, 'recipe'),
+    )
+    User.objects.update(
+        recipes_count=counter_subquery(Recipe, 'author'),
+        subscribers_count=counter_subquery(Subscribe, 'author'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0004_recipe_pub_date_id_idx'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в избранное'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Добавлений в корзину'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
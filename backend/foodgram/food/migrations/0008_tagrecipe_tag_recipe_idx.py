@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 06:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0007_recipe_image_processing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tagrecipe',
+            index=models.Index(fields=['tag', 'recipe'], name='tagrecipe_tag_recipe_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-17 06:14
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from food.search import INSTALL, UNINSTALL, execute_for_vendor
+
+SEARCH_INDEX = django.contrib.postgres.indexes.GinIndex(
+    fields=['search_vector'], name='recipe_search_vector_idx')
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('food', 'Recipe'),
+                                SEARCH_INDEX)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('food', 'Recipe'),
+                                   SEARCH_INDEX)
+
+
+def install_search(apps, schema_editor):
+    execute_for_vendor(schema_editor, INSTALL)
+
+
+def uninstall_search(apps, schema_editor):
+    execute_for_vendor(schema_editor, UNINSTALL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0008_tagrecipe_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='recipe',
+                    index=SEARCH_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_search_index, remove_search_index),
+            ],
+        ),
+        migrations.RunPython(install_search, uninstall_search),
+    ]
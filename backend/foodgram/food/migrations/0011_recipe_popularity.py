@@ -0,0 +1,90 @@
+# Generated by Django 4.2 on 2026-10-17 06:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from food.popularity import ARCHIVE_START
+from food.search import ensure_installed
+
+
+def fill_popularity(apps, schema_editor):
+    Recipe = apps.get_model('food', 'Recipe')
+    PopularityBucket = apps.get_model('food', 'PopularityBucket')
+    Recipe.objects.update(popularity_total=models.F('favorites_count')
+                          + models.F('in_carts_count'))
+    PopularityBucket.objects.bulk_create(
+        [PopularityBucket(recipe_id=recipe_id, start=ARCHIVE_START,
+                          score=total)
+         for recipe_id, total in Recipe.objects.filter(
+             popularity_total__gt=0).values_list('id', 'popularity_total')],
+        batch_size=1000)
+
+
+def reinstall_search(apps, schema_editor):
+    # SQLite пересоздает food_recipe при AddField и теряет триггеры FTS5
+    # из 0009.
+    ensure_installed(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('food', '0010_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(verbose_name='Начало часа')),
+                ('score', models.IntegerField(default=0, verbose_name='Изменение')),
+            ],
+            options={
+                'verbose_name': 'Популярность за час',
+                'verbose_name_plural': 'Популярность по часам',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity_day',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Популярность за день'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity_total',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Популярность за все время'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity_week',
+            field=models.IntegerField(default=0, editable=False, verbose_name='Популярность за неделю'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity_day', '-id'], name='recipe_popularity_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity_week', '-id'], name='recipe_popularity_week_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity_total', '-id'], name='recipe_popularity_total_idx'),
+        ),
+        migrations.AddField(
+            model_name='popularitybucket',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity_buckets', to='food.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddIndex(
+            model_name='popularitybucket',
+            index=models.Index(fields=['start'], name='popularity_bucket_start_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='popularitybucket',
+            constraint=models.UniqueConstraint(fields=('recipe', 'start'), name='unique_popularity_bucket'),
+        ),
+        migrations.RunPython(reinstall_search, migrations.RunPython.noop),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.utils.text import slugify
@@ -42,6 +44,15 @@ class Ingredient(models.Model):
 
 
 class Recipe(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готова'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    )
+
     name = models.CharField(
         verbose_name='Название', max_length=200, unique=True)
     text = models.TextField('Описание')
@@ -49,6 +60,12 @@ class Recipe(models.Model):
                                related_name='recipes', verbose_name='Автор')
     image = models.ImageField(verbose_name='Картинка',
                               upload_to='recipes/', blank=True)
+    image_status = models.CharField(
+        verbose_name='Обработка картинки', max_length=10,
+        choices=IMAGE_STATUSES, default=IMAGE_PENDING)
+    image_variants = models.JSONField(
+        verbose_name='Варианты картинки', default=dict, blank=True,
+        editable=False)
     ingredients = models.ManyToManyField(
         to=Ingredient, through='IngredientAmount',
         through_fields=('recipe', 'ingredient'), verbose_name='Ингредиенты')
@@ -56,14 +73,38 @@ class Recipe(models.Model):
         to=Tag, verbose_name='Тэги', through='TagRecipe')
     pub_date = models.DateTimeField(
         verbose_name='Время публикации', auto_now_add=True)
+    updated_at = models.DateTimeField(
+        verbose_name='Время изменения', auto_now=True, db_index=True)
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления в минутах',
         validators=[MinValueValidator(1)])
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное', default=0, editable=False)
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в корзину', default=0, editable=False)
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор', null=True, editable=False)
+    popularity_day = models.IntegerField(
+        verbose_name='Популярность за день', default=0, editable=False)
+    popularity_week = models.IntegerField(
+        verbose_name='Популярность за неделю', default=0, editable=False)
+    popularity_total = models.IntegerField(
+        verbose_name='Популярность за все время', default=0, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [models.Index(fields=['-pub_date', '-id'],
+                                name='recipe_pub_date_id_idx'),
+                   GinIndex(fields=['search_vector'],
+                            name='recipe_search_vector_idx'),
+                   models.Index(fields=['-popularity_day', '-id'],
+                                name='recipe_popularity_day_idx'),
+                   models.Index(fields=['-popularity_week', '-id'],
+                                name='recipe_popularity_week_idx'),
+                   models.Index(fields=['-popularity_total', '-id'],
+                                name='recipe_popularity_total_idx')]
 
     def __str__(self):
         return self.name
@@ -90,6 +131,8 @@ class TagRecipe(models.Model):
     class Meta:
         verbose_name = 'Тэг в рецепте'
         verbose_name_plural = 'Тэги в рецепте'
+        indexes = [models.Index(fields=['tag', 'recipe'],
+                                name='tagrecipe_tag_recipe_idx')]
 
 
 class IngredientAmount(models.Model):
@@ -146,3 +189,56 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user.username} - {self.recipe.name}'
+
+
+class FeedEntry(models.Model):
+    """
+    Запись материализованной ленты подписок: рецепт автора, на которого
+    подписан пользователь. Дата публикации продублирована, чтобы страница
+    ленты читалась по индексу (user, -pub_date, -recipe).
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='feed_entries',
+                             verbose_name='Читатель')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='feed_entries',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+', verbose_name='Автор')
+    pub_date = models.DateTimeField(verbose_name='Время публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [models.UniqueConstraint(fields=['user', 'recipe'],
+                                               name='unique_feed_entry')]
+        indexes = [models.Index(fields=['user', '-pub_date', '-recipe'],
+                                name='feed_user_pub_date_idx'),
+                   models.Index(fields=['user', 'author'],
+                                name='feed_user_author_idx')]
+
+    def __str__(self):
+        return f'{self.user.username} <- {self.recipe.name}'
+
+
+class PopularityBucket(models.Model):
+    """
+    Изменение популярности рецепта (избранное и корзина) за час.
+    Корзины старше недели сворачиваются в архивную с началом в 1970 году.
+    """
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='popularity_buckets',
+                               verbose_name='Рецепт')
+    start = models.DateTimeField(verbose_name='Начало часа')
+    score = models.IntegerField(verbose_name='Изменение', default=0)
+
+    class Meta:
+        verbose_name = 'Популярность за час'
+        verbose_name_plural = 'Популярность по часам'
+        constraints = [models.UniqueConstraint(
+            fields=['recipe', 'start'], name='unique_popularity_bucket')]
+        indexes = [models.Index(fields=['start'],
+                                name='popularity_bucket_start_idx')]
+
+    def __str__(self):
+        return f'{self.recipe.name} {self.start:%Y-%m-%d %H:00}: {self.score}'
@@ -0,0 +1,177 @@
+"""
+Инвертированный индекс «ингредиент -> рецепты» в памяти процесса для
+подбора рецептов по имеющимся продуктам.
+
+Для каждого ингредиента хранится отсортированный массив id рецептов
+(array), для каждого рецепта - кортеж id его ингредиентов. Процесс,
+сохранивший рецепт, обновляет свой индекс сразу и меняет метку версии
+PANTRY; остальные процессы при следующем запросе дочитывают рецепты,
+измененные с момента их последнего обновления (с запасом
+REFRESH_MARGIN на незавершенные транзакции). Удаленные рецепты
+вычищаются при выдаче.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict, namedtuple
+from datetime import timedelta
+
+from django.db.models import Max
+from food.versions import bump_version, get_version
+from foodgram.db_router import use_primary
+
+PANTRY = 'pantry'
+REFRESH_MARGIN = timedelta(minutes=1)
+CHUNK_SIZE = 10000
+PANTRY_MAX_SIZE = 100
+PANTRY_MAX_MISSING = 10
+
+Match = namedtuple('Match', ('recipe_id', 'matched', 'missing'))
+
+
+def group_ingredients(rows):
+    """
+    @param rows: пары (id рецепта, id ингредиента)
+    @return: словарь {id рецепта: множество id ингредиентов}
+    """
+    grouped = defaultdict(set)
+    for recipe_id, ingredient_id in rows:
+        grouped[recipe_id].add(ingredient_id)
+    return grouped
+
+
+class PantryIndex:
+    """
+    Индекс рецептов по ингредиентам
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._version = None
+        self._watermark = None
+        self._postings = {}
+        self._recipes = {}
+
+    def _build(self):
+        from food.models import IngredientAmount, Recipe
+
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(list)
+        with use_primary():
+            watermark = Recipe.objects.aggregate(
+                last=Max('updated_at'))['last']
+            rows = IngredientAmount.objects.order_by(
+                'ingredient_id', 'recipe_id').values_list(
+                'recipe_id', 'ingredient_id').distinct()
+            for recipe_id, ingredient_id in rows.iterator(CHUNK_SIZE):
+                postings[ingredient_id].append(recipe_id)
+                recipes[recipe_id].append(ingredient_id)
+        self._postings = dict(postings)
+        self._recipes = {recipe_id: tuple(ingredients)
+                         for recipe_id, ingredients in recipes.items()}
+        self._watermark = watermark
+        self._built = True
+
+    def _catch_up(self):
+        """
+        Перечитывает рецепты, измененные с момента прошлого обновления
+        """
+        from food.models import IngredientAmount, Recipe
+
+        if self._watermark is None:
+            self._build()
+            return
+        with use_primary():
+            changed = dict(Recipe.objects.filter(
+                updated_at__gte=self._watermark - REFRESH_MARGIN,
+            ).values_list('id', 'updated_at'))
+            grouped = group_ingredients(IngredientAmount.objects.filter(
+                recipe_id__in=list(changed)).values_list(
+                'recipe_id', 'ingredient_id'))
+        for recipe_id in changed:
+            self._set_recipe(recipe_id, grouped.get(recipe_id, ()))
+        if changed:
+            self._watermark = max(self._watermark, *changed.values())
+
+    def _set_recipe(self, recipe_id, ingredient_ids):
+        for ingredient_id in self._recipes.pop(recipe_id, ()):
+            recipes = self._postings[ingredient_id]
+            position = bisect_left(recipes, recipe_id)
+            if position < len(recipes) and recipes[position] == recipe_id:
+                del recipes[position]
+        ingredient_ids = tuple(sorted(set(ingredient_ids)))
+        if ingredient_ids:
+            self._recipes[recipe_id] = ingredient_ids
+        for ingredient_id in ingredient_ids:
+            insort(self._postings.setdefault(ingredient_id, array('q')),
+                   recipe_id)
+
+    def refresh(self):
+        """
+        Строит индекс или дочитывает изменения, если сменилась версия
+        """
+        version = get_version(PANTRY)
+        with self._lock:
+            if not self._built:
+                self._build()
+            elif version != self._version:
+                self._catch_up()
+            self._version = version
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """
+        Обновляет ингредиенты рецепта в индексе процесса и сообщает
+        остальным процессам об изменении
+        @param recipe_id: id рецепта
+        @param ingredient_ids: id ингредиентов рецепта, пустой список -
+                               удалить рецепт из индекса
+        """
+        with self._lock:
+            if self._built:
+                self._set_recipe(recipe_id, ingredient_ids)
+        bump_version(PANTRY)
+
+    def discard(self, recipe_ids):
+        """
+        Убирает из индекса процесса рецепты, которых уже нет в базе
+        """
+        with self._lock:
+            for recipe_id in recipe_ids:
+                self._set_recipe(recipe_id, ())
+
+    def search(self, pantry, missing=0):
+        """
+        Подбирает рецепты, в которых не хватает не больше missing
+        ингредиентов из pantry
+        @param pantry: множество id имеющихся ингредиентов
+        @param missing: сколько ингредиентов может не хватать
+        @return: список Match по убыванию доли имеющихся ингредиентов,
+                 затем по возрастанию недостающих и новизне рецепта
+        """
+        self.refresh()
+        with self._lock:
+            matched = Counter()
+            for ingredient_id in set(pantry):
+                matched.update(self._postings.get(ingredient_id, ()))
+            matches = []
+            for recipe_id, count in matched.items():
+                lack = len(self._recipes[recipe_id]) - count
+                if lack <= missing:
+                    matches.append(Match(recipe_id, count, lack))
+        matches.sort(key=lambda match: (
+            -match.matched / (match.matched + match.missing),
+            match.missing, -match.recipe_id))
+        return matches
+
+    def missing_ingredients(self, recipe_id, pantry):
+        """
+        @return: id ингредиентов рецепта, которых нет в pantry
+        """
+        with self._lock:
+            return [ingredient_id
+                    for ingredient_id in self._recipes.get(recipe_id, ())
+                    if ingredient_id not in pantry]
+
+
+pantry_index = PantryIndex()
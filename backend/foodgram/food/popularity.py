@@ -0,0 +1,139 @@
+"""
+Популярность рецептов: добавления в избранное и в корзину.
+
+Каждое добавление или удаление меняет на ±1 часовую корзину
+PopularityBucket и сразу все три окна на рецепте (popularity_day,
+popularity_week, popularity_total), по которым построены индексы, так
+что сортировка по популярности читается по индексу без агрегации
+избранного и корзин. Корзины, выпавшие из окна, вычитает периодическое
+уплотнение compact(): оно пересчитывает окна дня и недели по корзинам
+и сворачивает корзины старше ARCHIVE_AFTER в одну архивную на рецепт.
+"""
+from datetime import datetime, timedelta, timezone
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone as django_timezone
+from food.models import PopularityBucket, Recipe
+from food.versions import bump_version
+
+POPULARITY = 'popularity'
+ARCHIVE_AFTER = timedelta(days=8)
+ARCHIVE_START = datetime(1970, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 1000
+
+WINDOWS = {
+    'day': ('popularity_day', timedelta(days=1)),
+    'week': ('popularity_week', timedelta(days=7)),
+    'all': ('popularity_total', None),
+}
+
+
+def bucket_start(moment):
+    """
+    @return: начало часовой корзины, в которую попадает moment
+    """
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def add_to_bucket(recipe_id, start, delta):
+    """
+    Атомарно прибавляет delta к корзине, создавая ее при необходимости
+    """
+    buckets = PopularityBucket.objects.filter(recipe_id=recipe_id,
+                                              start=start)
+    if buckets.update(score=F('score') + delta):
+        return
+    try:
+        with transaction.atomic():
+            PopularityBucket.objects.create(recipe_id=recipe_id,
+                                            start=start, score=delta)
+    except IntegrityError:
+        buckets.update(score=F('score') + delta)
+
+
+def change_popularity(recipe, delta):
+    """
+    Учитывает добавление (delta > 0) или удаление (delta < 0) рецепта
+    в избранном или корзине. Вызывается внутри транзакции переключения.
+    @param recipe: экземпляр модели Recipe
+    @param delta: изменение популярности
+    """
+    if not delta:
+        return
+    add_to_bucket(recipe.pk, bucket_start(django_timezone.now()), delta)
+    Recipe.objects.filter(pk=recipe.pk).update(**{
+        field: F(field) + delta for field, _ in WINDOWS.values()})
+    transaction.on_commit(lambda: bump_version(POPULARITY))
+
+
+def archive(before):
+    """
+    Сворачивает корзины старше before в архивную корзину рецепта
+    @return: сколько корзин свернуто
+    """
+    old = PopularityBucket.objects.filter(start__lt=before).exclude(
+        start=ARCHIVE_START)
+    totals = old.values('recipe_id').annotate(total=Sum('score')).order_by()
+    for row in totals.iterator(BATCH_SIZE):
+        add_to_bucket(row['recipe_id'], ARCHIVE_START, row['total'])
+    folded, _ = old.delete()
+    return folded
+
+
+def recount_window(field, since):
+    """
+    Пересчитывает окно популярности по корзинам, начиная с since
+    @return: сколько рецептов изменилось
+    """
+    scores = dict(PopularityBucket.objects.filter(
+        start__gte=bucket_start(since),
+    ).values('recipe_id').annotate(total=Sum('score')).order_by(
+    ).values_list('recipe_id', 'total'))
+    changed = [
+        Recipe(pk=recipe_id, **{field: scores.get(recipe_id, 0)})
+        for recipe_id, value in Recipe.objects.filter(
+            Q(pk__in=list(scores)) | ~Q(**{field: 0}),
+        ).values_list('id', field).iterator(BATCH_SIZE)
+        if value != scores.get(recipe_id, 0)
+    ]
+    Recipe.objects.bulk_update(changed, [field], batch_size=BATCH_SIZE)
+    return len(changed)
+
+
+def compact(now=None):
+    """
+    Уплотняет корзины и пересчитывает окна дня и недели
+    @param now: текущее время, по умолчанию timezone.now()
+    @return: словарь {что сделано: сколько}
+    """
+    now = now or django_timezone.now()
+    with transaction.atomic():
+        result = {'archived': archive(now - ARCHIVE_AFTER)}
+        for name, (field, window) in WINDOWS.items():
+            if window is not None:
+                result[name] = recount_window(field, now - window)
+        transaction.on_commit(lambda: bump_version(POPULARITY))
+    return result
+
+
+def rebuild():
+    """
+    Заново заполняет популярность из счетчиков избранного и корзин:
+    время добавлений неизвестно, поэтому все попадает в архивную корзину
+    @return: сколько рецептов учтено
+    """
+    with transaction.atomic():
+        PopularityBucket.objects.all().delete()
+        Recipe.objects.update(
+            popularity_day=0, popularity_week=0,
+            popularity_total=F('favorites_count') + F('in_carts_count'))
+        recipes = Recipe.objects.filter(popularity_total__gt=0)
+        PopularityBucket.objects.bulk_create(
+            (PopularityBucket(recipe_id=recipe_id, start=ARCHIVE_START,
+                              score=total)
+             for recipe_id, total in recipes.values_list(
+                 'id', 'popularity_total').iterator(BATCH_SIZE)),
+            batch_size=BATCH_SIZE)
+        transaction.on_commit(lambda: bump_version(POPULARITY))
+    return recipes.count()
@@ -0,0 +1,218 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+На обеих СУБД каждое слово запроса ищется как префикс, слова
+объединяются через AND, поэтому набираемый запрос («окро») находит
+рецепт так же, как целое слово.
+
+На PostgreSQL поле Recipe.search_vector поддерживает триггер: название
+с весом A, описание с весом B, словарь russian со стеммингом. По полю
+построен GIN-индекс, результаты ранжируются ts_rank. Слова запроса тоже
+проходят стемминг, поэтому другая форма слова («борща») находит рецепт.
+
+На SQLite те же запросы обслуживает внешняя FTS5-таблица
+food_recipe_fts, которую поддерживают триггеры, а ранжирует bm25.
+Стемминга для русского в FTS5 нет: форма слова длиннее той, что
+в тексте, не находится.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models import F
+
+SEARCH_CONFIG = 'russian'
+SEARCH_MIGRATION = '0009_recipe_search'
+
+PG_INSTALL = (
+    f"""
+    CREATE FUNCTION food_recipe_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}',
+                                  coalesce(NEW.name, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_CONFIG}',
+                                     coalesce(NEW.text, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER food_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, text ON food_recipe
+    FOR EACH ROW EXECUTE FUNCTION food_recipe_search_vector_update()
+    """,
+    'UPDATE food_recipe SET name = name',
+)
+
+PG_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS food_recipe_search_vector_trigger '
+    'ON food_recipe',
+    'DROP FUNCTION IF EXISTS food_recipe_search_vector_update()',
+)
+
+SQLITE_INSTALL = (
+    """
+    CREATE VIRTUAL TABLE food_recipe_fts USING fts5(
+        name, text, content='food_recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER food_recipe_fts_insert AFTER INSERT ON food_recipe BEGIN
+        INSERT INTO food_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER food_recipe_fts_delete AFTER DELETE ON food_recipe BEGIN
+        INSERT INTO food_recipe_fts (food_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER food_recipe_fts_update AFTER UPDATE OF name, text
+    ON food_recipe BEGIN
+        INSERT INTO food_recipe_fts (food_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO food_recipe_fts (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "INSERT INTO food_recipe_fts (food_recipe_fts) VALUES ('rebuild')",
+)
+
+SQLITE_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS food_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS food_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS food_recipe_fts_update',
+    'DROP TABLE IF EXISTS food_recipe_fts',
+)
+
+INSTALL = {'postgresql': PG_INSTALL, 'sqlite': SQLITE_INSTALL}
+UNINSTALL = {'postgresql': PG_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}
+
+INSTALLED_CHECKS = {
+    'postgresql': (
+        'SELECT count(*) FROM pg_trigger WHERE tgname IN (%s)',
+        ('food_recipe_search_vector_trigger',),
+    ),
+    'sqlite': (
+        'SELECT count(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)',
+        ('food_recipe_fts', 'food_recipe_fts_insert',
+         'food_recipe_fts_delete', 'food_recipe_fts_update'),
+    ),
+}
+
+
+def execute_for_vendor(schema_editor, statements):
+    """
+    Выполняет SQL для СУБД соединения, остальные СУБД пропускает
+    @param schema_editor: schema_editor миграции
+    @param statements: словарь {vendor: список запросов}
+    """
+    for statement in statements.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def search_installed(connection):
+    """
+    Проверяет, что триггеры поиска на месте: SQLite при пересоздании
+    таблицы в миграциях (AddField, AlterField) удаляет ее триггеры
+    @param connection: соединение с базой данных
+    @return: True, если все объекты поиска существуют
+    """
+    if connection.vendor not in INSTALLED_CHECKS:
+        return True
+    sql, names = INSTALLED_CHECKS[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, names)
+        return cursor.fetchone()[0] == len(names)
+
+
+def ensure_installed(schema_editor):
+    """
+    Заново ставит триггеры и перестраивает индекс поиска, если их нет
+    @param schema_editor: schema_editor миграции
+    @return: True, если поиск пришлось переустановить
+    """
+    if search_installed(schema_editor.connection):
+        return False
+    execute_for_vendor(schema_editor, UNINSTALL)
+    execute_for_vendor(schema_editor, INSTALL)
+    return True
+
+
+def ensure_installed_after_migrate(using, **kwargs):
+    """
+    Обработчик post_migrate: восстанавливает поиск после миграций,
+    пересоздавших таблицу рецептов
+    @param using: алиас базы данных
+    """
+    connection = connections[using]
+    recorder = MigrationRecorder(connection)
+    if not recorder.has_table() or not recorder.migration_qs.filter(
+            app='food', name=SEARCH_MIGRATION).exists():
+        return
+    with connection.schema_editor() as schema_editor:
+        ensure_installed(schema_editor)
+
+
+def query_words(text):
+    """
+    @param text: строка поиска
+    @return: слова запроса в нижнем регистре
+    """
+    return re.findall(r'\w+', text.lower())
+
+
+def fts5_query(words):
+    """
+    Запрос FTS5: каждое слово в кавычках как префикс, слова через AND
+    @param words: слова запроса
+    @return: строка запроса FTS5
+    """
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def tsquery(words):
+    """
+    Запрос tsquery: каждое слово после стемминга как префикс, слова через
+    AND. Слова состоят только из букв и цифр, поэтому синтаксис tsquery
+    в них не попадает.
+    @param words: слова запроса
+    @return: объект SearchQuery
+    """
+    return SearchQuery(' & '.join(f'{word}:*' for word in words),
+                       config=SEARCH_CONFIG, search_type='raw')
+
+
+def search_recipes(queryset, text):
+    """
+    Оставляет рецепты, подходящие под запрос, и сортирует по релевантности
+    @param queryset: queryset рецептов
+    @param text: строка поиска
+    @return: отфильтрованный queryset с аннотацией search_rank
+    """
+    words = query_words(text)
+    if not words:
+        return queryset
+    if connections[queryset.db].vendor == 'sqlite':
+        # Соединение с FTS5-таблицей: bm25 считается за один проход по
+        # совпадениям. RawSQL с коррелированным подзапросом на каждую
+        # строку рецептов заново выполнял бы MATCH, а присоединить
+        # таблицу без модели ORM умеет только через extra().
+        recipe_table = queryset.model._meta.db_table
+        fts_table = f'{recipe_table}_fts'
+        return queryset.extra(
+            select={'search_rank': f'-bm25({fts_table}, 10.0, 1.0)'},
+            tables=[fts_table],
+            where=[f'{fts_table}.rowid = {recipe_table}.id',
+                   f'{fts_table} MATCH %s'],
+            params=[fts5_query(words)],
+        ).order_by('-search_rank', '-pub_date')
+    query = tsquery(words)
+    return queryset.filter(search_vector=query).annotate(
+        search_rank=SearchRank(F('search_vector'), query),
+    ).order_by('-search_rank', '-pub_date')
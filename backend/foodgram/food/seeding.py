@@ -0,0 +1,283 @@
+import dataclasses
+import os.path
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+from food import popularity
+from food.counters import counters, recount
+from food.loaders import batches, bulk_load, read_csv
+from food.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                         ShoppingCart, Tag, TagRecipe)
+from food.versions import VERSIONS_CACHE
+from users.models import Subscribe, User
+
+BATCH_SIZE = 5000
+
+TAGS = (
+    ('Завтрак', '#E26C2D'),
+    ('Обед', '#49B64E'),
+    ('Ужин', '#8775D2'),
+    ('Десерт', '#E24C8D'),
+    ('Выпечка', '#C2A14D'),
+)
+
+
+@contextmanager
+def manual_dates(model, *field_names):
+    """
+    Временно отключает auto_now и auto_now_add у полей модели, чтобы
+    bulk_create сохранил заданные даты
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def power_law_weights(count, alpha):
+    """
+    Накопленные веса закона Ципфа: k-й элемент в 1/k^alpha раз
+    популярнее первого
+    @param count: количество элементов
+    @param alpha: показатель степени
+    @return: список накопленных весов для random.choices
+    """
+    return list(accumulate(1 / (rank ** alpha)
+                           for rank in range(1, count + 1)))
+
+
+@dataclasses.dataclass
+class Seeder:
+    """
+    Генератор синтетических данных. Популярность авторов и ингредиентов
+    распределена по степенному закону, результат определяется seed.
+    Строки пишутся через bulk_create пачками по batch_size.
+    """
+    users: int
+    recipes: int
+    seed: int = 0
+    favorites: float = 10
+    carts: float = 3
+    subscriptions: float = 5
+    alpha: float = 1.1
+    days: int = 365
+    password: str = None
+    batch_size: int = BATCH_SIZE
+    log: Callable = print
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+
+    def insert(self, model, objects, ignore_conflicts=False):
+        """
+        Вставляет объекты из генератора пачками
+        @return: количество вставленных (для ignore_conflicts - переданных)
+        строк
+        """
+        started = time.perf_counter()
+        total = 0
+        for batch in batches(objects, self.batch_size):
+            model.objects.bulk_create(batch, ignore_conflicts=ignore_conflicts)
+            total += len(batch)
+        self.log(f'{model.__name__}: {total} за '
+                 f'{time.perf_counter() - started:.1f} с')
+        return total
+
+    def per_user(self, mean, cap):
+        return min(int(self.rng.expovariate(1 / mean)), cap) if mean else 0
+
+    def pick_unique(self, population, cum_weights, count, exclude=None):
+        picked = set()
+        for _ in range(count * 3):
+            if len(picked) >= count:
+                break
+            item = self.rng.choices(population, cum_weights=cum_weights)[0]
+            if item != exclude:
+                picked.add(item)
+        return sorted(picked)
+
+    def run(self, path):
+        """
+        Заполняет базу
+        @param path: путь к CSV-каталогу ингредиентов
+        """
+        bulk_load(read_csv(path), self.batch_size)
+        self.tag_ids = [
+            Tag.objects.get_or_create(
+                name=name, defaults={'color': color})[0].pk
+            for name, color in TAGS
+        ]
+        self.ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        self.rng.shuffle(self.ingredient_ids)
+        self.seed_users()
+        self.seed_recipes()
+        self.seed_recipe_details()
+        self.seed_user_relations()
+
+    def seed_users(self):
+        password = make_password(self.password)
+        offset = User.objects.count()
+        self.insert(User, (
+            User(username=f'user{number}',
+                 email=f'user{number}@example.com',
+                 first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+                 password=password)
+            for number in range(offset, offset + self.users)
+        ))
+        self.user_ids = list(
+            User.objects.order_by('id').values_list('id', flat=True))
+        self.authors = self.user_ids[:]
+        self.rng.shuffle(self.authors)
+        self.author_weights = power_law_weights(len(self.authors), self.alpha)
+
+    def recipe_objects(self, offset):
+        now = timezone.now()
+        authors = self.rng.choices(self.authors,
+                                   cum_weights=self.author_weights,
+                                   k=self.recipes)
+        for number, author_id in enumerate(authors, start=offset):
+            pub_date = now - timedelta(
+                seconds=self.rng.randint(0, self.days * 86400))
+            yield Recipe(
+                name=f'Рецепт {number}', text=f'Описание рецепта {number}',
+                author_id=author_id, cooking_time=self.rng.randint(5, 180),
+                image='recipes/seed.jpg', image_status=Recipe.IMAGE_READY,
+                pub_date=pub_date, updated_at=pub_date)
+
+    def seed_recipes(self):
+        offset = Recipe.objects.count()
+        with manual_dates(Recipe, 'pub_date', 'updated_at'):
+            self.insert(Recipe, self.recipe_objects(offset))
+        rows = Recipe.objects.order_by('id').values_list('id', 'author_id')
+        weights = dict(zip(self.authors,
+                           (1 / (rank ** self.alpha) for rank in
+                            range(1, len(self.authors) + 1))))
+        self.recipe_ids = []
+        recipe_weights = []
+        for recipe_id, author_id in rows.iterator():
+            self.recipe_ids.append(recipe_id)
+            recipe_weights.append(weights[author_id])
+        self.recipe_weights = list(accumulate(recipe_weights))
+
+    def seed_recipe_details(self):
+        ingredient_weights = power_law_weights(len(self.ingredient_ids),
+                                               self.alpha)
+
+        def amounts():
+            for recipe_id in self.recipe_ids:
+                count = round(self.rng.triangular(3, 15, 7))
+                for ingredient_id in self.pick_unique(
+                        self.ingredient_ids, ingredient_weights, count):
+                    yield IngredientAmount(
+                        recipe_id=recipe_id, ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500))
+
+        def tags():
+            for recipe_id in self.recipe_ids:
+                for tag_id in self.rng.sample(self.tag_ids,
+                                              self.rng.randint(1, 3)):
+                    yield TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+
+        self.insert(IngredientAmount, amounts(), ignore_conflicts=True)
+        self.insert(TagRecipe, tags())
+
+    def user_relations(self, model, mean):
+        cap = len(self.recipe_ids) // 3
+        for user_id in self.user_ids:
+            for recipe_id in self.pick_unique(
+                    self.recipe_ids, self.recipe_weights,
+                    self.per_user(mean, cap)):
+                yield model(user_id=user_id, recipe_id=recipe_id)
+
+    def subscription_objects(self):
+        cap = len(self.user_ids) // 3
+        for user_id in self.user_ids:
+            for author_id in self.pick_unique(
+                    self.authors, self.author_weights,
+                    self.per_user(self.subscriptions, cap),
+                    exclude=user_id):
+                yield Subscribe(user_id=user_id, author_id=author_id)
+
+    def seed_user_relations(self):
+        self.insert(Favorite, self.user_relations(Favorite, self.favorites),
+                    ignore_conflicts=True)
+        self.insert(ShoppingCart, self.user_relations(ShoppingCart,
+                                                      self.carts),
+                    ignore_conflicts=True)
+        self.insert(Subscribe, self.subscription_objects(),
+                    ignore_conflicts=True)
+
+
+def seed_dataset(path, users, recipes, seed=0, **options):
+    """
+    Заполняет базу синтетическими данными, пересчитывает счетчики
+    и популярность рецептов
+    @param path: путь к CSV-каталогу ингредиентов
+    @param users: количество пользователей
+    @param recipes: количество рецептов
+    @param seed: начальное значение генератора случайных чисел
+    @param options: остальные параметры Seeder
+    """
+    Seeder(users, recipes, seed, **options).run(path)
+    for counter in counters():
+        recount(*counter)
+    popularity.rebuild()
+
+
+@contextmanager
+def seeded_test_database(users, recipes, keepdb=False):
+    """
+    Создает тестовую базу, заполняет ее и удаляет по выходе из блока.
+    Кэш на время работы заменяется локальным.
+    @param users: количество пользователей
+    @param recipes: количество рецептов
+    @param keepdb: не удалять базу и не заполнять ее повторно
+    """
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, keepdb=keepdb)
+    if not keepdb:
+        # Тестовая база SQLite в памяти переживает destroy_test_db.
+        call_command('flush', interactive=False, verbosity=0)
+    try:
+        with override_settings(
+                ALLOWED_HOSTS=['testserver'],
+                CACHES={alias: {'BACKEND': 'django.core.cache.backends.'
+                                           'locmem.LocMemCache',
+                                'LOCATION': f'seed-{alias}'}
+                        for alias in ('default', VERSIONS_CACHE)}):
+            if not User.objects.exists():
+                seed_dataset(os.path.join(settings.BASE_DIR, 'data',
+                                          'ingredients.csv'),
+                             users, recipes, log=lambda message: None)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            yield
+    finally:
+        connection.creation.destroy_test_db(
+            old_name, verbosity=0, keepdb=keepdb)
+
+
+def heaviest_user():
+    """
+    Возвращает пользователя с наибольшим числом подписок
+    @return: экземпляр модели User
+    """
+    return User.objects.annotate(
+        subscriptions=Count('subscriber')).order_by('-subscriptions')[0]
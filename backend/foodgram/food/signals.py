@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from food import feed
+from food.catalog import bump_catalog_version
+from food.counters import change_counter
+from food.models import Ingredient, Recipe, Tag
+from food.pantry import PANTRY, pantry_index
+from food.versions import bump_version
+from users.models import Subscribe, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    """Сбрасывает индекс ингредиентов при изменении каталога."""
+    bump_catalog_version()
+    bump_version('recipes')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    """Сбрасывает кэш тегов и версию рецептов при изменении тега."""
+    bump_version('tags')
+    bump_version('recipes')
+
+
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+def author_fields(user):
+    """
+    @return: поля автора, которые показывает рецепт; отложенные поля
+             не загружаются
+    """
+    return tuple(user.__dict__.get(field) for field in AUTHOR_FIELDS)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipes_changed(**kwargs):
+    """
+    Меняет версию рецептов при удалении рецепта: оно не отражается
+    в Recipe.updated_at.
+    """
+    bump_version('recipes')
+
+
+@receiver(post_init, sender=User)
+def remember_author_fields(instance, **kwargs):
+    instance._author_fields = author_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, created, **kwargs):
+    """
+    Меняет версию рецептов, когда у пользователя меняются поля автора
+    в выдаче рецептов. Сохранения других полей (last_login при входе)
+    версию не трогают.
+    """
+    current = author_fields(instance)
+    if created or current == instance._author_fields:
+        return
+    instance._author_fields = current
+    bump_version('recipes')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(**kwargs):
+    """
+    Сообщает индексам подбора по ингредиентам, что рецепт изменился:
+    ингредиенты из админки сохраняются вместе с рецептом.
+    """
+    transaction.on_commit(lambda: bump_version(PANTRY))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    """Убирает удаленный рецепт из индекса подбора по ингредиентам."""
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: pantry_index.update_recipe(recipe_id, ()))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    """Раскладывает новый рецепт по материализованным лентам подписчиков."""
+    if created:
+        feed.fan_out(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    """
+    Увеличивает счетчик рецептов автора. Счетчик ведется сигналами, чтобы
+    рецепты из админки и скриптов тоже учитывались; bulk_create сигналов
+    не отправляет, после него счетчики чинит команда recount.
+    """
+    if created:
+        change_counter(User(pk=instance.author_id), 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(instance, **kwargs):
+    """
+    Уменьшает счетчик рецептов автора. Сигнал отправляется в транзакции
+    удаления, поэтому счетчик не расходится с данными при откате.
+    """
+    change_counter(User(pk=instance.author_id), 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscription_created(instance, created, **kwargs):
+    """Дописывает рецепты автора в ленту подписчика."""
+    if created:
+        feed.subscribed(instance.user, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscription_deleted(instance, **kwargs):
+    """Убирает рецепты автора из ленты подписчика."""
+    feed.unsubscribed(instance.user, instance.author_id)
@@ -0,0 +1,168 @@
+import io
+import shutil
+import tempfile
+from unittest import mock, skipUnless
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import override_settings
+from food.images import (FORMATS, VARIANTS, make_variants,
+                         process_pending_images, process_recipe_image)
+from food.loaders import load_ingredients
+from food.models import Ingredient, Recipe
+from food.search import (UNINSTALL, ensure_installed_after_migrate,
+                         execute_for_vendor, search_installed, search_recipes)
+from PIL import Image
+from users.models import User
+
+ROWS = (('соль', 'г'), ('перец', 'г'), ('соль', 'г'), ('соль', 'щепотка'))
+
+
+class LoadIngredientsTests(TestCase):
+    """Загрузка каталога пропускает уже существующие ингредиенты."""
+
+    def assert_loads(self, use_copy):
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.assertEqual(load_ingredients(ROWS, 2, use_copy=use_copy),
+                         (len(ROWS), 2))
+        self.assertCountEqual(
+            Ingredient.objects.values_list('name', 'measurement_unit'),
+            [('соль', 'г'), ('перец', 'г'), ('соль', 'щепотка')])
+
+    def test_bulk_load(self):
+        self.assert_loads(use_copy=False)
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'COPY есть только в PostgreSQL')
+    def test_copy_load(self):
+        self.assert_loads(use_copy=True)
+
+
+class SearchInstallTests(TransactionTestCase):
+    """Поиск восстанавливается после потери триггеров."""
+
+    def test_reinstalls_dropped_triggers(self):
+        with connection.schema_editor() as schema_editor:
+            execute_for_vendor(schema_editor, UNINSTALL)
+        self.assertFalse(search_installed(connection))
+        ensure_installed_after_migrate(using=connection.alias)
+        self.assertTrue(search_installed(connection))
+
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+        recipe = Recipe.objects.create(
+            author=author, name='Борщ', text='Свекла и капуста',
+            image='recipes/test.png', cooking_time=60)
+        self.assertEqual(
+            list(search_recipes(Recipe.objects.all(), 'свекла')), [recipe])
+
+
+class MakeVariantsTests(SimpleTestCase):
+    """Небольшая картинка не дает вариантов одинаковой ширины."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def variants(self, size):
+        return make_variants(Image.new('RGB', size, (200, 80, 40)))
+
+    def test_large_image(self):
+        variants = self.variants((2000, 1000))
+        self.assertEqual([variants[name]['width'] for name in VARIANTS],
+                         [160, 600, 1600])
+        for variant in variants.values():
+            for key in FORMATS:
+                self.assertTrue(default_storage.exists(variant[key]))
+
+    def test_small_image_reuses_files(self):
+        variants = self.variants((400, 200))
+        self.assertEqual([variants[name]['width'] for name in VARIANTS],
+                         [160, 400, 400])
+        self.assertEqual(variants['full'], variants['card'])
+        self.assertFalse(default_storage.exists('recipes/full'))
+
+        variants = self.variants((100, 50))
+        self.assertEqual(
+            variants, {name: variants['thumbnail'] for name in VARIANTS})
+
+
+def png_content(size):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ProcessImagesTests(TestCase):
+    """Обработка загруженных картинок рецептов."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='pass')
+
+    def upload(self, content, name='raw.png'):
+        return default_storage.save(f'recipes/{name}', ContentFile(content))
+
+    def create_recipe(self, image, name='Борщ'):
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Свекла и капуста',
+            image=image, cooking_time=60)
+
+    def test_processed(self):
+        raw_name = self.upload(png_content((800, 400)))
+        recipe = self.create_recipe(raw_name)
+        self.assertTrue(process_recipe_image(recipe))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(recipe.image.name,
+                         recipe.image_variants['full']['jpeg'])
+        self.assertEqual(recipe.image_variants['card']['width'], 600)
+        self.assertFalse(default_storage.exists(raw_name))
+
+    def test_replaced_image_is_kept(self):
+        raw_name = self.upload(png_content((800, 400)))
+        recipe = self.create_recipe(raw_name)
+        new_name = self.upload(png_content((300, 300)), 'new.png')
+        Recipe.objects.filter(pk=recipe.pk).update(image=new_name)
+        self.assertFalse(process_recipe_image(recipe))
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.image.name, recipe.image_status),
+                         (new_name, Recipe.IMAGE_PENDING))
+        self.assertTrue(default_storage.exists(raw_name))
+
+    def test_broken_image_fails(self):
+        recipe = self.create_recipe(self.upload(b'not an image'))
+        self.assertFalse(process_recipe_image(recipe))
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_FAILED)
+
+    def test_pending_batch(self):
+        ready = self.create_recipe(self.upload(png_content((80, 80))))
+        broken = self.create_recipe(self.upload(b'not an image'), 'Щи')
+        crashed = self.create_recipe(self.upload(png_content((80, 80))),
+                                     'Уха')
+        original = process_recipe_image
+
+        def process(recipe):
+            if recipe.pk == crashed.pk:
+                raise RuntimeError('сбой кодирования')
+            return original(recipe)
+
+        with mock.patch('food.images.process_recipe_image', process):
+            with self.assertLogs('foodgram.images', 'ERROR'):
+                self.assertEqual(process_pending_images(10), 3)
+        self.assertEqual(process_pending_images(10), 0)
+        self.assertEqual(
+            dict(Recipe.objects.values_list('pk', 'image_status')),
+            {ready.pk: Recipe.IMAGE_READY, broken.pk: Recipe.IMAGE_FAILED,
+             crashed.pk: Recipe.IMAGE_FAILED})
@@ -0,0 +1,44 @@
+import uuid
+
+from django.core.cache import caches
+
+VERSIONS_CACHE = 'versions'
+
+
+def version_key(name):
+    return f'food:version:{name}'
+
+
+def get_version(name):
+    """
+    Возвращает текущую метку версии набора данных. Если метки нет (набор
+    еще не менялся или хранилище очищено), создает новую: None метка быть
+    не может, иначе после потери метки снова совпали бы старые ETag.
+    @param name: имя набора данных, например 'recipes'
+    @return: строка версии
+    """
+    versions = caches[VERSIONS_CACHE]
+    key = version_key(name)
+    version = versions.get(key)
+    if version is not None:
+        return version
+    version = uuid.uuid4().hex
+    versions.add(key, version, None)
+    return versions.get(key, version)
+
+
+def bump_version(name):
+    """
+    Помечает набор данных как измененный
+    @param name: имя набора данных
+    """
+    caches[VERSIONS_CACHE].set(version_key(name), uuid.uuid4().hex, None)
+
+
+def user_state(user):
+    """
+    Имя набора данных с избранным, корзиной и подписками пользователя
+    @param user: экземпляр модели User
+    @return: имя набора данных
+    """
+    return f'user:{user.pk}'
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+# Читающие эндпоинты обслуживаются асинхронными обработчиками api.async_views
+os.environ.setdefault('ASYNC_READS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,127 @@
+"""
+Чтение с реплик. ReplicaRoutingMiddleware разрешает чтение с реплики
+только на время безопасного запроса (GET, HEAD, OPTIONS) клиента, который
+недавно ничего не менял. После успешного изменяющего запроса клиент
+REPLICA_STICKY_SECONDS читает с основной базы и видит свои изменения.
+Клиент определяется по заголовку Authorization, анонимный - по сессии,
+а без нее - по IP из доверенного заголовка прокси REPLICA_CLIENT_IP_HEADER.
+REMOTE_ADDR за nginx у всех клиентов один и не используется.
+
+Вне запросов (команды, обработчик картинок) и внутри транзакций все
+запросы идут в основную базу. Код, который заполняет долгоживущие кэши
+по свежей метке версии, оборачивается в use_primary(), чтобы отстающая
+реплика не закэшировала старые данные под новой меткой.
+"""
+import hashlib
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_PREFIX = 'replica_'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+replica_allowed = ContextVar('replica_allowed', default=False)
+
+
+@contextmanager
+def use_primary():
+    """
+    Направляет чтение внутри блока в основную базу
+    """
+    token = replica_allowed.set(False)
+    try:
+        yield
+    finally:
+        replica_allowed.reset(token)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias.startswith(REPLICA_PREFIX)]
+
+
+class ReplicaRouter:
+    """
+    Пишет и мигрирует только основную базу, читает с случайной реплики,
+    если это разрешено для текущего запроса
+    """
+
+    def __init__(self):
+        self.replicas = replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        if (not self.replicas or not replica_allowed.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Разрешает чтение с реплик для безопасных запросов и включает
+    прилипание к основной базе после изменений
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.window = settings.REPLICA_STICKY_SECONDS
+        self.ip_header = settings.REPLICA_CLIENT_IP_HEADER
+
+    def ip_key(self, request):
+        ip = self.ip_header and request.headers.get(self.ip_header)
+        return f'db:primary:ip:{ip}' if ip else None
+
+    def client_key(self, request):
+        """
+        Ключ, под которым запоминается изменение клиента
+        @return: ключ кэша или None, если клиента не отличить от других
+        """
+        authorization = request.headers.get('Authorization')
+        if authorization:
+            digest = hashlib.sha256(authorization.encode()).hexdigest()
+            return f'db:primary:auth:{digest}'
+        session = getattr(request, 'session', None)
+        if session is not None and session.session_key:
+            return f'db:primary:session:{session.session_key}'
+        return self.ip_key(request)
+
+    def client_keys(self, request):
+        """
+        Ключи, по которым проверяется прилипание. Ключ по IP проверяется
+        и для клиентов с токеном: токен, полученный анонимным входом,
+        иначе искался бы на реплике, которая его еще не видела.
+        @return: кортеж (ключ клиента или None, список ключей проверки)
+        """
+        key = self.client_key(request)
+        ip_key = self.ip_key(request)
+        return key, [name for name in dict.fromkeys((key, ip_key)) if name]
+
+    def is_sticky(self, keys):
+        now = time.time()
+        return any(until > now for until in cache.get_many(keys).values())
+
+    def __call__(self, request):
+        key, keys = self.client_keys(request)
+        safe = request.method in SAFE_METHODS
+        token = replica_allowed.set(safe and not self.is_sticky(keys))
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_allowed.reset(token)
+        if not safe and response.status_code < 400 and key:
+            cache.set(key, time.time() + self.window, self.window)
+        return response
@@ -0,0 +1,104 @@
+"""
+Бэкенд PostgreSQL с пулом соединений на процесс. Настройки пула берутся
+из ключа POOL в DATABASES (MAX_SIZE, TIMEOUT, MAX_LIFETIME,
+HEALTH_CHECK_AFTER). Django закрывает соединение в конце запроса
+(CONN_MAX_AGE=0), и оно возвращается в пул вместо разрыва.
+"""
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from .pool import ConnectionPool, PoolTimeoutError
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    """
+    Проверяет соединение запросом SELECT 1
+    @return: True, если соединение рабочее
+    """
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+def reset_connection(connection):
+    """
+    Откатывает незавершенную транзакцию перед возвратом в пул
+    @return: True, если соединение можно переиспользовать
+    """
+    if connection.closed:
+        return False
+    try:
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+def get_pool(alias, options):
+    """
+    Возвращает пул соединений алиаса для текущего процесса. После fork
+    соединения родителя не используются и не закрываются.
+    @param alias: алиас базы данных
+    @param options: словарь POOL из настроек
+    @return: объект ConnectionPool
+    """
+    with pools_lock:
+        pool = pools.get(alias)
+        if pool is None or pool.pid != os.getpid():
+            pools[alias] = ConnectionPool(
+                check_connection, reset_connection,
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 5),
+                max_lifetime=options.get('MAX_LIFETIME', 1800),
+                health_check_after=options.get('HEALTH_CHECK_AFTER', 5),
+            )
+        return pools[alias]
+
+
+def pool_stats():
+    """
+    @return: статистика пулов текущего процесса по алиасам
+    """
+    with pools_lock:
+        current = dict(pools)
+    return {alias: pool.stats() for alias, pool in current.items()
+            if pool.pid == os.getpid()}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict.get('POOL', {}))
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.pool.checkout(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params))
+        except PoolTimeoutError as error:
+            raise self.Database.OperationalError(str(error)) from error
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', IsolationLevel.READ_COMMITTED))
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
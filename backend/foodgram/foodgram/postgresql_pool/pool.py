@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+    """Все соединения заняты дольше, чем timeout."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса. Соединение выдается из простаивающих
+    (последнее возвращенное - первым), иначе создается новое, пока размер
+    меньше max_size, иначе запрос ждет до timeout секунд и получает
+    PoolTimeoutError. Соединения старше max_lifetime закрываются, простоявшие
+    дольше health_check_after проверяются перед выдачей.
+    """
+
+    def __init__(self, check, reset, max_size=10, timeout=5,
+                 max_lifetime=1800, health_check_after=5):
+        """
+        @param check: функция проверки соединения, возвращает bool
+        @param reset: функция сброса состояния при возврате, возвращает
+                      bool - можно ли переиспользовать соединение
+        @param max_size: максимальное число соединений
+        @param timeout: сколько ждать свободного соединения, в секундах
+        @param max_lifetime: максимальный возраст соединения, в секундах
+        @param health_check_after: проверять соединения, простоявшие
+                                   дольше этого, в секундах; None - никогда
+        """
+        self.check = check
+        self.reset = reset
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_check_after = health_check_after
+        self.pid = os.getpid()
+        self.size = 0
+        self._idle = []
+        self._in_use = {}
+        self._condition = threading.Condition()
+        self.counters = dict.fromkeys((
+            'checkouts', 'waits', 'timeouts', 'created', 'closed',
+            'connect_errors', 'health_check_failures'), 0)
+        self.wait_time = 0.0
+
+    def expired(self, created):
+        return (self.max_lifetime is not None
+                and time.monotonic() - created > self.max_lifetime)
+
+    def needs_check(self, returned):
+        return (self.health_check_after is not None
+                and time.monotonic() - returned >= self.health_check_after)
+
+    def discard(self, connection):
+        """
+        Закрывает соединение и освобождает место в пуле
+        """
+        with self._condition:
+            self.size -= 1
+            self.counters['closed'] += 1
+            self._condition.notify()
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def reserve(self):
+        """
+        Под блокировкой берет простаивающее соединение или место под
+        новое, при необходимости ожидая
+        @return: запись (соединение, время создания, время возврата) или
+                 None, если нужно создать соединение
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            if self._idle:
+                return self._idle.pop()
+            if self.size < self.max_size:
+                self.size += 1
+                return None
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.counters['timeouts'] += 1
+                raise PoolTimeoutError(
+                    f'Нет свободных соединений за {self.timeout} с '
+                    f'(размер пула {self.max_size}).')
+            if not waited:
+                self.counters['waits'] += 1
+                waited = True
+            started = time.monotonic()
+            self._condition.wait(remaining)
+            self.wait_time += time.monotonic() - started
+
+    def create(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self.size -= 1
+                self.counters['connect_errors'] += 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.counters['created'] += 1
+        return connection, time.monotonic()
+
+    def checkout(self, connect):
+        """
+        Выдает соединение
+        @param connect: функция создания нового соединения
+        @return: соединение
+        """
+        with self._condition:
+            self.counters['checkouts'] += 1
+        while True:
+            with self._condition:
+                entry = self.reserve()
+            if entry is None:
+                connection, created = self.create(connect)
+                break
+            connection, created, returned = entry
+            if self.expired(created):
+                self.discard(connection)
+                continue
+            if self.needs_check(returned) and not self.check(connection):
+                with self._condition:
+                    self.counters['health_check_failures'] += 1
+                self.discard(connection)
+                continue
+            break
+        with self._condition:
+            self._in_use[id(connection)] = created
+        return connection
+
+    def checkin(self, connection):
+        """
+        Возвращает соединение в пул или закрывает его, если оно сломано
+        или устарело
+        """
+        with self._condition:
+            created = self._in_use.pop(id(connection), None)
+        if created is None:
+            connection.close()
+            return
+        if self.expired(created) or not self.reset(connection):
+            self.discard(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, created, time.monotonic()))
+            self._condition.notify()
+
+    def stats(self):
+        """
+        @return: словарь с размером пула и счетчиками
+        """
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                **self.counters,
+                'wait_time_ms': round(self.wait_time * 1000, 2),
+            }
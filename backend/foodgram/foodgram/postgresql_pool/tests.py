@@ -0,0 +1,113 @@
+import threading
+import time
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from .pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Логика пула на соединениях-заглушках."""
+
+    def make_pool(self, check=lambda connection: True,
+                  reset=lambda connection: True, **options):
+        return ConnectionPool(check, reset, **options)
+
+    def test_reuses_returned_connection(self):
+        pool = self.make_pool()
+        first = pool.checkout(FakeConnection)
+        pool.checkin(first)
+        self.assertIs(pool.checkout(FakeConnection), first)
+        stats = pool.stats()
+        self.assertEqual((stats['checkouts'], stats['created']), (2, 1))
+        self.assertEqual((stats['size'], stats['in_use']), (1, 1))
+
+    def test_timeout_when_exhausted(self):
+        pool = self.make_pool(max_size=1, timeout=0.01)
+        pool.checkout(FakeConnection)
+        with self.assertRaises(PoolTimeoutError):
+            pool.checkout(FakeConnection)
+        stats = pool.stats()
+        self.assertEqual((stats['waits'], stats['timeouts']), (1, 1))
+
+    def test_waiter_gets_returned_connection(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        first = pool.checkout(FakeConnection)
+        received = []
+        waiter = threading.Thread(
+            target=lambda: received.append(pool.checkout(FakeConnection)))
+        waiter.start()
+        while not pool.stats()['waits']:
+            time.sleep(0.001)
+        pool.checkin(first)
+        waiter.join(5)
+        self.assertEqual(received, [first])
+        self.assertEqual(pool.stats()['created'], 1)
+
+    def test_failed_health_check_replaces_connection(self):
+        pool = self.make_pool(check=lambda connection: False,
+                              health_check_after=0)
+        first = pool.checkout(FakeConnection)
+        pool.checkin(first)
+        second = pool.checkout(FakeConnection)
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        stats = pool.stats()
+        self.assertEqual(stats['health_check_failures'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_expired_and_broken_connections_are_closed(self):
+        for options in ({'max_lifetime': 0},
+                        {'reset': lambda connection: False}):
+            with self.subTest(options=options):
+                pool = self.make_pool(**options)
+                first = pool.checkout(FakeConnection)
+                pool.checkin(first)
+                self.assertTrue(first.closed)
+                self.assertEqual(pool.stats()['size'], 0)
+
+    def test_connect_error_frees_slot(self):
+        pool = self.make_pool(max_size=1)
+
+        def broken():
+            raise OSError('нет соединения')
+
+        with self.assertRaises(OSError):
+            pool.checkout(broken)
+        pool.checkout(FakeConnection)
+        stats = pool.stats()
+        self.assertEqual((stats['connect_errors'], stats['size']), (1, 1))
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Бэкенд с пулом работает только с PostgreSQL')
+class PooledBackendTests(TestCase):
+    """Бэкенд возвращает соединения psycopg2 в пул."""
+
+    def test_connection_returns_to_pool(self):
+        from .base import DatabaseWrapper, get_pool, pools
+
+        settings_dict = {**connection.settings_dict, 'POOL': {'MAX_SIZE': 2}}
+        wrapper = DatabaseWrapper(settings_dict, alias='pool_test')
+        self.addCleanup(pools.pop, 'pool_test', None)
+        for _ in range(2):
+            wrapper.connect()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close()
+        stats = get_pool('pool_test', {}).stats()
+        self.assertEqual((stats['checkouts'], stats['created']), (2, 1))
+        self.assertEqual(stats['idle'], 1)
+        for pooled, _, _ in get_pool('pool_test', {})._idle:
+            pooled.close()
@@ -0,0 +1,160 @@
+"""
+Профилирование запросов. Включается переменной окружения PROFILING:
+тогда ProfilingMiddleware добавляется в MIDDLEWARE, а без нее ни
+middleware, ни обертки сериализаторов не устанавливаются.
+
+Для каждого запроса считаются число и время SQL-запросов, время
+сериализации и общее время; они отдаются в заголовке Server-Timing и
+пишутся строкой JSON в логгер foodgram.profiling. Доля запросов
+PROFILING_SAMPLE_RATE выполняется под cProfile, и если такой запрос
+дольше PROFILING_THRESHOLD_MS, профиль сохраняется в PROFILING_DIR.
+"""
+import cProfile
+import functools
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import ListSerializer, Serializer
+
+logger = logging.getLogger('foodgram.profiling')
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Счетчики одного запроса
+    """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.depth = 0
+
+    def sql(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+
+
+def timed_data(data):
+    """
+    Оборачивает свойство data сериализатора подсчетом времени. Вложенные
+    вызовы не учитываются повторно.
+    @param data: исходное свойство
+    @return: новое свойство
+    """
+    getter = data.fget
+
+    @functools.wraps(getter)
+    def wrapper(serializer):
+        profile = current_profile.get()
+        if profile is None or profile.depth:
+            return getter(serializer)
+        profile.depth += 1
+        started = time.perf_counter()
+        try:
+            return getter(serializer)
+        finally:
+            profile.serializer_time += time.perf_counter() - started
+            profile.depth -= 1
+
+    wrapper.profiled = True
+    return property(wrapper)
+
+
+def install_serializer_timing():
+    for serializer_class in (Serializer, ListSerializer):
+        if not getattr(serializer_class.data.fget, 'profiled', False):
+            serializer_class.data = timed_data(serializer_class.data)
+
+
+class ProfilingMiddleware:
+    """
+    Замеряет SQL, сериализацию и общее время запроса
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.threshold = settings.PROFILING_THRESHOLD_MS
+        self.directory = settings.PROFILING_DIR
+        install_serializer_timing()
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        profiler = self.start_profiler()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.sql))
+                response = self.get_response(request)
+        finally:
+            total = (time.perf_counter() - started) * 1000
+            if profiler:
+                profiler.disable()
+            current_profile.reset(token)
+        dump = None
+        if profiler and total >= self.threshold:
+            dump = self.dump(profiler, request, total)
+        self.report(request, response, profile, total, dump)
+        return response
+
+    def start_profiler(self):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В потоке уже работает другой профилировщик
+            return None
+        return profiler
+
+    def dump(self, profiler, request, total):
+        """
+        Сохраняет профиль медленного запроса
+        @return: путь к файлу
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        slug = re.sub(r'[^\w]+', '-', request.path).strip('-') or 'root'
+        path = os.path.join(
+            self.directory,
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{request.method}-{slug}-'
+            f'{total:.0f}ms.prof')
+        profiler.dump_stats(path)
+        return path
+
+    def report(self, request, response, profile, total, dump):
+        sql_ms = profile.sql_time * 1000
+        serializer_ms = profile.serializer_time * 1000
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={sql_ms:.1f};desc="{profile.sql_count} queries"',
+            f'serializer;dur={serializer_ms:.1f}',
+            f'total;dur={total:.1f}',
+        ))
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total, 2),
+            'sql_count': profile.sql_count,
+            'sql_ms': round(sql_ms, 2),
+            'serializer_ms': round(serializer_ms, 2),
+            'profile': dump,
+        }, ensure_ascii=False))
@@ -104,6 +104,109 @@ DATABASES = {
     }
 }
 
+# Пул соединений PostgreSQL на процесс, включается DB_POOL_SIZE > 0
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=0, cast=int)
+
+if (DB_POOL_SIZE
+        and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'):
+    DATABASES['default']['ENGINE'] = 'foodgram.postgresql_pool'
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': DB_POOL_SIZE,
+        'TIMEOUT': config('DB_POOL_TIMEOUT', default=5, cast=float),
+        'MAX_LIFETIME': config('DB_POOL_MAX_LIFETIME', default=1800,
+                               cast=float),
+        'HEALTH_CHECK_AFTER': config('DB_POOL_HEALTH_CHECK_AFTER',
+                                     default=5, cast=float),
+    }
+
+# Реплики для чтения: DB_REPLICAS - список через запятую в формате
+# [имя_базы@]хост[:порт], недостающие части берутся из default
+for number, replica in enumerate(filter(None, os.getenv(
+        'DB_REPLICAS', default='').split(','))):
+    name, _, address = replica.rpartition('@')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = config('REPLICA_STICKY_SECONDS', default=5,
+                                cast=int)
+# Заголовок с IP клиента, который выставляет nginx (infra/nginx.conf).
+# Пустое значение - не различать анонимных клиентов без сессии по IP.
+REPLICA_CLIENT_IP_HEADER = config('REPLICA_CLIENT_IP_HEADER',
+                                  default='X-Real-IP')
+
+if len(DATABASES) > 1:
+    MIDDLEWARE.append('foodgram.db_router.ReplicaRoutingMiddleware')
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION',
+                              default='/tmp/foodgram_cache'),
+    },
+    # Метки версий из food/versions.py: без истечения и без вытеснения,
+    # иначе потерянная метка вернет в оборот старые ETag и ключи кэша.
+    'versions': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('VERSION_CACHE_LOCATION',
+                              default='/tmp/foodgram_versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
+REFERENCE_CACHE_MAX_BYTES = int(os.getenv('REFERENCE_CACHE_MAX_BYTES',
+                                          default=4 * 1024 * 1024))
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT',
+                                        default=24 * 60 * 60))
+
+FEED_MATERIALIZE_THRESHOLD = config('FEED_MATERIALIZE_THRESHOLD', default=100,
+                                    cast=int)
+
+ASYNC_READS = config('ASYNC_READS', default=False, cast=bool)
+
+PROFILING = config('PROFILING', default=False, cast=bool)
+
+PROFILING_SAMPLE_RATE = config('PROFILING_SAMPLE_RATE', default=0.01,
+                               cast=float)
+
+PROFILING_THRESHOLD_MS = config('PROFILING_THRESHOLD_MS', default=500,
+                                cast=float)
+
+PROFILING_DIR = os.getenv('PROFILING_DIR', default='/tmp/foodgram_profiles')
+
+if PROFILING:
+    MIDDLEWARE.insert(0, 'foodgram.profiling.ProfilingMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'foodgram.profiling': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
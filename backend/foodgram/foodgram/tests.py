@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from rest_framework import serializers
+from rest_framework.serializers import ListSerializer, Serializer
+from users.models import User
+
+from .db_router import ReplicaRoutingMiddleware, replica_allowed
+from .profiling import ProfilingMiddleware
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-replica-routing'}},
+    REPLICA_STICKY_SECONDS=5, REPLICA_CLIENT_IP_HEADER='X-Real-IP')
+class ReplicaRoutingMiddlewareTests(SimpleTestCase):
+    """Прилипание к основной базе различает клиентов за nginx."""
+
+    def setUp(self):
+        cache.clear()
+        self.allowed = []
+
+        def get_response(request):
+            self.allowed.append(replica_allowed.get())
+            return HttpResponse()
+
+        self.middleware = ReplicaRoutingMiddleware(get_response)
+        self.factory = RequestFactory(REMOTE_ADDR='172.18.0.2')
+
+    def reads_replica(self, ip, token=None):
+        """
+        @return: разрешено ли GET-запросу клиента читать с реплики
+        """
+        headers = {'X-Real-IP': ip}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        self.middleware(self.factory.get('/api/recipes/', headers=headers))
+        return self.allowed[-1]
+
+    def write(self, ip, token=None):
+        headers = {'X-Real-IP': ip}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        self.middleware(self.factory.post('/api/recipes/', headers=headers))
+
+    def test_token_clients_behind_one_ip(self):
+        self.write('10.0.0.1', token='first')
+        self.assertFalse(self.reads_replica('10.0.0.1', token='first'))
+        self.assertTrue(self.reads_replica('10.0.0.1', token='second'))
+
+    def test_anonymous_clients_by_real_ip(self):
+        self.write('10.0.0.1')
+        self.assertFalse(self.reads_replica('10.0.0.1'))
+        self.assertTrue(self.reads_replica('10.0.0.2'))
+
+    def test_token_after_anonymous_login(self):
+        self.write('10.0.0.1')
+        self.assertFalse(self.reads_replica('10.0.0.1', token='new'))
+
+    @override_settings(REPLICA_CLIENT_IP_HEADER='')
+    def test_untrusted_ip_is_ignored(self):
+        self.middleware = ReplicaRoutingMiddleware(
+            self.middleware.get_response)
+        self.write('10.0.0.1')
+        self.assertTrue(self.reads_replica('10.0.0.1'))
+
+
+class NameSerializer(serializers.Serializer):
+    name = serializers.CharField()
+
+
+class ProfilingMiddlewareTests(TestCase):
+    """Server-Timing на каждом запросе и профили медленных запросов."""
+
+    def setUp(self):
+        for serializer_class in (Serializer, ListSerializer):
+            self.addCleanup(setattr, serializer_class, 'data',
+                            serializer_class.data)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def get_response(self, request):
+        User.objects.count()
+        User.objects.exists()
+        NameSerializer([{'name': 'соль'}], many=True).data
+        return HttpResponse()
+
+    def call(self, sample_rate=0, threshold=0):
+        """
+        Выполняет запрос через middleware с заданными настройками
+        @return: кортеж (ответ, запись лога в виде словаря)
+        """
+        with override_settings(PROFILING_SAMPLE_RATE=sample_rate,
+                               PROFILING_THRESHOLD_MS=threshold,
+                               PROFILING_DIR=self.directory):
+            middleware = ProfilingMiddleware(self.get_response)
+        with self.assertLogs('foodgram.profiling', 'INFO') as logs:
+            response = middleware(RequestFactory().get('/api/recipes/'))
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_server_timing(self):
+        response, record = self.call()
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^sql;dur=[\d.]+;desc="2 queries", '
+                                 r'serializer;dur=[\d.]+, total;dur=[\d.]+$')
+        self.assertEqual(
+            (record['path'], record['status'], record['sql_count'],
+             record['profile']),
+            ('/api/recipes/', 200, 2, None))
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_slow_sampled_request_is_dumped(self):
+        _, record = self.call(sample_rate=1)
+        self.assertEqual(os.listdir(self.directory),
+                         [os.path.basename(record['profile'])])
+        self.assertRegex(record['profile'],
+                         r'-GET-api-recipes-\d+ms\.prof$')
+        self.assertGreater(os.path.getsize(record['profile']), 0)
+
+    def test_fast_request_is_not_dumped(self):
+        _, record = self.call(sample_rate=1, threshold=10 ** 6)
+        self.assertIsNone(record['profile'])
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sample_rate(self):
+        for roll, dumped in ((0.3, True), (0.5, False)):
+            with self.subTest(roll=roll):
+                with mock.patch('foodgram.profiling.random.random',
+                                return_value=roll):
+                    _, record = self.call(sample_rate=0.4)
+                self.assertEqual(record['profile'] is not None, dumped)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='feed_materialized',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Лента подписок материализована'),
+        ),
+    ]
@@ -4,6 +4,13 @@ from django.db import models
 
 class User(AbstractUser):
     email = models.EmailField(max_length=255, unique=True)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков', default=0, editable=False)
+    feed_materialized = models.BooleanField(
+        verbose_name='Лента подписок материализована', default=False,
+        editable=False)
 
     class Meta:
         ordering = ['id']
@@ -1,5 +1,11 @@
 #!/bin/bash
+# SERVER=asgi запускает асинхронный вариант с воркерами uvicorn
 cd foodgram && \
 python manage.py migrate --noinput && \
 python manage.py collectstatic --noinput && \
-gunicorn -w 3 -b 0.0.0.0:8000 foodgram.wsgi:application
\ No newline at end of file
+if [ "$SERVER" = "asgi" ]; then
+    gunicorn -w 3 -k uvicorn.workers.UvicornWorker -b 0.0.0.0:8000 \
+        foodgram.asgi:application
+else
+    gunicorn -w 3 -b 0.0.0.0:8000 foodgram.wsgi:application
+fi